@@ -0,0 +1,76 @@
+"""
+    compares building the account table of `get_accounts_for_org_chart` row by
+    row on a DataFrame with collecting the rows in a ColumnBuffer.
+
+    usage: python benchmarks/bench_frame_builder.py [max_rows]
+"""
+import os
+import sys
+import time
+import pandas as pd
+
+# runnable from a checkout without installing haws
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from haws.services.frame_helper import ColumnBuffer
+
+COLUMNS = ['parent_id', 'account_id', 'account_arn',
+           'account_email', 'account_name']
+SIZES = [1000, 5000, 10000, 50000]
+# row-wise appends are quadratic; beyond this size they take minutes
+MAX_ROWWISE = 5000
+
+
+def make_row(index: int) -> dict:
+    account_id = str(100000000000 + index)
+    return {
+        'parent_id': 'ou-%04d' % (index % 900),
+        'account_id': account_id,
+        'account_arn': 'arn:aws:organizations::000000000000:account/' + account_id,
+        'account_email': account_id + '@example.com',
+        'account_name': 'account-' + account_id
+    }
+
+
+def build_rowwise(n: int) -> pd.DataFrame:
+    df = pd.DataFrame(columns=COLUMNS)
+    for index in range(n):
+        # equivalent of the removed DataFrame.append(row, ignore_index=True)
+        df = pd.concat([df, pd.DataFrame([make_row(index)])],
+                       ignore_index=True)
+    return df
+
+
+def build_columnar(n: int) -> pd.DataFrame:
+    rows = ColumnBuffer(columns=COLUMNS)
+    for index in range(n):
+        rows.append(make_row(index))
+    return rows.to_frame()
+
+
+def timed(builder, n: int) -> float:
+    start = time.perf_counter()
+    builder(n)
+    return time.perf_counter() - start
+
+
+def main(max_rows: int = SIZES[-1]):
+    sizes = [n for n in SIZES if n <= max_rows]
+    print(f'{"rows":>8} {"rowwise s":>10} {"columnar s":>11} {"us/row":>8}')
+    per_row = list()
+    for n in sizes:
+        rowwise = timed(build_rowwise, n) if n <= MAX_ROWWISE else None
+        columnar = timed(build_columnar, n)
+        per_row.append(columnar / n * 1e6)
+        rowwise_out = f'{rowwise:10.3f}' if rowwise is not None else f'{"-":>10}'
+        print(f'{n:>8} {rowwise_out} {columnar:11.3f} {per_row[-1]:8.2f}')
+
+    # linear scaling: cost per row must stay flat as the table grows
+    growth = per_row[-1] / per_row[0]
+    print(f'per-row cost growth {sizes[0]} -> {sizes[-1]} rows: {growth:.2f}x')
+    if growth > 3:
+        sys.exit('columnar builder does not scale linearly')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,74 @@
+"""
+    compares loading a saved `entire_org` chart from the pickle output with
+    loading it from the Arrow IPC output, in full and column by column.
+
+    usage: python benchmarks/bench_org_output.py [accounts]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+# runnable from a checkout without installing haws
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from haws.services.aws.organization_check import load_org_chart, save_org_output
+
+REPEAT = 5
+
+
+def make_entire_org(accounts: int, ous: int = 900) -> pd.DataFrame:
+    ou_ids = ['ou-%04d' % (index % ous) for index in range(accounts)]
+    account_ids = [str(100000000000 + index) for index in range(accounts)]
+    return pd.DataFrame({
+        'parent_id_x': ou_ids,
+        'child_id': ou_ids,
+        'child_name': ['name-' + ou for ou in ou_ids],
+        'child_arn': ['arn:aws:organizations::000000000000:ou/' + ou for ou in ou_ids],
+        'parent_id_y': ou_ids,
+        'account_id': account_ids,
+        'account_arn': ['arn:aws:organizations::000000000000:account/' + account for account in account_ids],
+        'account_email': [account + '@example.com' for account in account_ids],
+        'account_name': ['account-' + account for account in account_ids]
+    })
+
+
+def timed(loader) -> float:
+    best = np.inf
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        loader()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(accounts: int = 50000):
+    data = make_entire_org(accounts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            pickle_path = save_org_output(data, 'entire_org', 'pickle')
+            arrow_path = save_org_output(data, 'entire_org', 'arrow')
+        finally:
+            os.chdir(cwd)
+
+        results = {
+            'pickle, full': timed(lambda: load_org_chart(pickle_path)),
+            'arrow, full': timed(lambda: load_org_chart(arrow_path)),
+            'pickle, 2 columns': timed(lambda: load_org_chart(
+                pickle_path, columns=['account_id', 'child_id'])),
+            'arrow, 2 columns': timed(lambda: load_org_chart(
+                arrow_path, columns=['account_id', 'child_id']))
+        }
+
+        print(f'{accounts} accounts, best of {REPEAT}')
+        for name, duration in results.items():
+            print(f'{name:<20} {duration * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
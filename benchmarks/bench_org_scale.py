@@ -0,0 +1,247 @@
+"""
+    runs the org pipeline (traverse_ous, get_accounts_for_org_chart per
+    parent, the bulk mode with and without a cached snapshot,
+    get_relevant_accounts) against synthetic
+    organizations of 10 to 50k accounts. AWS Organizations is answered by a
+    `before-call` hook on the pooled session, so no request leaves the
+    process and the rate limiter never waits.
+
+    every scenario runs twice: once for wall time and API calls and once
+    under tracemalloc for the peak memory per phase, so tracing does not
+    distort the timings. results are saved to
+    benchmarks/results/org_benchmark.json.
+
+    usage: python benchmarks/bench_org_scale.py [scenario ...]
+"""
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from botocore.awsrequest import AWSResponse
+
+# runnable from a checkout without installing haws
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+# org snapshots go to a scratch cache instead of the user's; runtime_helper
+# reads the cache directory when it is imported
+os.environ['HAWS_CACHE_DIR'] = tempfile.mkdtemp(prefix='haws-bench-')
+from haws.services.aws import client_pool
+from haws.services.aws.org_snapshot import snapshot_path
+from haws.services.aws.organization_check import (
+    get_accounts_for_org_chart, get_relevant_accounts, map_accounts_cached, traverse_ous)
+
+# name -> (accounts, depth, fanout): number of OU levels below the root and
+# child OUs per OU
+SCENARIOS = {
+    'small': (10, 1, 3),
+    '1k-deep': (1000, 5, 3),
+    '1k-wide': (1000, 1, 100),
+    '50k-balanced': (50000, 3, 12),
+    '50k-wide': (50000, 2, 60),
+    '50k-deep': (50000, 8, 3)
+}
+# the maximum page sizes of the Organizations list calls
+PAGE_SIZE = 20
+ACCOUNT_NAMES = ['prod', 'dev', 'test', 'sandbox', 'shared', 'qa']
+BILLING_ACCOUNT = '000000000000'
+RESULT_FILE = os.path.join(BENCHMARK_DIR, 'results', 'org_benchmark.json')
+
+
+class SyntheticOrg:
+    """
+        a balanced OU tree with the accounts spread evenly over all OUs and
+        the root, answering the Organizations list calls page by page.
+    """
+
+    def __init__(self, accounts: int, depth: int, fanout: int):
+        self.root = 'r-root'
+        self.children = {self.root: []}
+        self.parent = dict()
+        self.accounts = dict()
+        self.calls = dict()
+        self.lock = threading.Lock()
+
+        level = [self.root]
+        for _ in range(depth):
+            next_level = []
+            for parent in level:
+                for _ in range(fanout):
+                    ou = 'ou-%08d' % len(self.parent)
+                    self.children[parent].append(ou)
+                    self.children[ou] = []
+                    self.parent[ou] = parent
+                    next_level.append(ou)
+            level = next_level
+
+        parents = list(self.children)
+        self.accounts = {parent: [] for parent in parents}
+        for index in range(accounts):
+            account = {
+                'Id': '%012d' % (100000000000 + index),
+                'Arn': 'arn:aws:organizations::%s:account/%012d' % (BILLING_ACCOUNT, 100000000000 + index),
+                'Email': 'account-%d@example.com' % index,
+                'Name': '%s-%d' % (ACCOUNT_NAMES[index % len(ACCOUNT_NAMES)], index),
+                'Status': 'ACTIVE'
+            }
+            parent = parents[index % len(parents)]
+            self.accounts[parent].append(account)
+            self.parent[account['Id']] = parent
+        self.all_accounts = [account for parent in parents for account in self.accounts[parent]]
+
+    @property
+    def ous(self) -> int:
+        return len(self.children) - 1
+
+    def page(self, items: list, key: str, params: dict) -> dict:
+        start = int(params.get('NextToken') or 0)
+        size = min(params.get('MaxResults', PAGE_SIZE), PAGE_SIZE)
+        page = {key: items[start:start + size]}
+        if start + size < len(items):
+            page['NextToken'] = str(start + size)
+        return page
+
+    def respond(self, operation: str, params: dict) -> dict:
+        if operation == 'ListRoots':
+            return {'Roots': [{'Id': self.root, 'Arn': 'arn:root', 'Name': 'Root'}]}
+        if operation == 'ListOrganizationalUnitsForParent':
+            ous = [{'Id': ou, 'Arn': 'arn:aws:organizations::ou/' + ou, 'Name': 'name-' + ou}
+                   for ou in self.children[params['ParentId']]]
+            return self.page(ous, 'OrganizationalUnits', params)
+        if operation == 'ListAccountsForParent':
+            return self.page(self.accounts[params['ParentId']], 'Accounts', params)
+        if operation == 'ListAccounts':
+            return self.page(self.all_accounts, 'Accounts', params)
+        if operation == 'ListParents':
+            parent = self.parent[params['ChildId']]
+            kind = 'ROOT' if parent == self.root else 'ORGANIZATIONAL_UNIT'
+            return {'Parents': [{'Id': parent, 'Type': kind}]}
+        if operation == 'DescribeOrganization':
+            return {'Organization': {'MasterAccountId': BILLING_ACCOUNT,
+                                     'MasterAccountArn': 'arn:' + BILLING_ACCOUNT}}
+        raise NotImplementedError(operation)
+
+    def capture_params(self, params: dict, context: dict, **kwargs):
+        # before-call only sees the serialized request
+        context['api_params'] = dict(params)
+
+    def before_call(self, model, context: dict, **kwargs):
+        with self.lock:
+            self.calls[model.name] = self.calls.get(model.name, 0) + 1
+        parsed = self.respond(model.name, context['api_params'])
+        return AWSResponse(None, 200, {}, None), parsed
+
+    def install(self):
+        client_pool.reset()
+        events = client_pool.get_session().events
+        events.register('before-parameter-build.organizations', self.capture_params)
+        events.register('before-call.organizations', self.before_call)
+        # loads the service model outside of the measured phases
+        client_pool.get_client('organizations')
+
+    def call_count(self) -> dict:
+        with self.lock:
+            return dict(self.calls)
+
+
+def measure(org: SyntheticOrg, func, trace: bool) -> tuple:
+    calls_before = org.call_count()
+    if trace:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    result = func()
+    wall_time = time.perf_counter() - start
+
+    peak = tracemalloc.get_traced_memory()[1] - baseline if trace else None
+    calls = {operation: count - calls_before.get(operation, 0)
+             for operation, count in org.call_count().items()
+             if count != calls_before.get(operation, 0)}
+
+    return result, {'wall_time': wall_time, 'api_calls': calls, 'peak_memory': peak}
+
+
+def run_pipeline(org: SyntheticOrg, trace: bool) -> dict:
+    phases = dict()
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            ou_chart, phases['traverse_ous'] = measure(
+                org, lambda: traverse_ous(root_id=org.root), trace)
+            org_df, phases['get_accounts_for_org_chart'] = measure(
+                org, lambda: get_accounts_for_org_chart(org=ou_chart), trace)
+            # haws run --bulk-accounts: the first run has no snapshot and
+            # lists the accounts per OU, the next one reuses its parents
+            if os.path.exists(snapshot_path(org.root)):
+                os.remove(snapshot_path(org.root))
+            _, phases['map_accounts_cached[bulk, no snapshot]'] = measure(
+                org, lambda: map_accounts_cached(org.root, ou_chart, bulk=True), trace)
+            _, phases['map_accounts_cached[bulk, cached snapshot]'] = measure(
+                org, lambda: map_accounts_cached(org.root, ou_chart, bulk=True), trace)
+            _, phases['get_relevant_accounts'] = measure(
+                org, lambda: get_relevant_accounts(org_df=org_df), trace)
+        finally:
+            os.chdir(cwd)
+
+    return phases
+
+
+def run_scenario(name: str) -> dict:
+    accounts, depth, fanout = SCENARIOS[name]
+    org = SyntheticOrg(accounts, depth, fanout)
+    org.install()
+
+    timed = run_pipeline(org, trace=False)
+    tracemalloc.start()
+    try:
+        traced = run_pipeline(org, trace=True)
+    finally:
+        tracemalloc.stop()
+
+    for phase, result in timed.items():
+        result['peak_memory'] = traced[phase]['peak_memory']
+
+    return {'scenario': name, 'accounts': accounts, 'ous': org.ous,
+            'depth': depth, 'fanout': fanout, 'phases': timed}
+
+
+def main(*scenarios: str):
+    scenarios = scenarios or tuple(SCENARIOS)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runtime = os.path.join(tmp, 'runtime.json')
+        with open(runtime, 'w') as fh:
+            json.dump({'billing_account_id': BILLING_ACCOUNT}, fh)
+        os.environ['HAWS_RUNTIME'] = runtime
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+
+        try:
+            results = [run_scenario(name) for name in scenarios]
+        finally:
+            shutil.rmtree(os.environ['HAWS_CACHE_DIR'], ignore_errors=True)
+
+    for result in results:
+        print(f'{result["scenario"]}: {result["accounts"]} accounts, {result["ous"]} OUs')
+        for phase, measured in result['phases'].items():
+            print(f'  {phase:<50} {measured["wall_time"] * 1000:10.1f} ms'
+                  f' {sum(measured["api_calls"].values()):7d} calls'
+                  f' {measured["peak_memory"] / 2 ** 20:8.1f} MiB peak')
+
+    os.makedirs(os.path.dirname(RESULT_FILE), exist_ok=True)
+    with open(RESULT_FILE, 'w') as fh:
+        json.dump({'python': platform.python_version(), 'page_size': PAGE_SIZE,
+                   'scenarios': results}, fh, indent=4)
+    print(f'saved {RESULT_FILE}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,55 @@
+"""
+    measures the startup time of `haws --help` and `haws run --help` in a
+    fresh interpreter and fails when it exceeds the budget or when the
+    help output pulls in boto3, botocore, pandas or numpy.
+
+    usage: python benchmarks/bench_startup.py [budget_ms]
+"""
+import os
+import subprocess
+import sys
+import time
+
+REPEAT = 7
+BUDGET_MS = 200
+HEAVY_MODULES = ['boto3', 'botocore', 'pandas', 'numpy', 'pyarrow']
+
+PROBE = """
+import sys
+from haws.main import cli
+try:
+    cli(%r, prog_name='haws')
+except SystemExit:
+    pass
+sys.stderr.write(','.join(name for name in %r if name in sys.modules))
+"""
+
+
+def probe(args: list) -> tuple:
+    # timed from outside, interpreter startup is part of what users wait for
+    code = PROBE % (args, HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, '-c', code], env=env,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        best = min(best, time.perf_counter() - start)
+    heavy = [name for name in process.stderr.strip().split(',') if name]
+    return best, heavy
+
+
+def main(budget_ms: int = BUDGET_MS):
+    failed = False
+    for args in (['--help'], ['run', '--help']):
+        best, heavy = probe(args)
+        over_budget = best * 1000 > budget_ms
+        failed = failed or over_budget or len(heavy) != 0
+        print(f"haws {' '.join(args):<12} {best * 1000:8.1f} ms (budget {budget_ms} ms)"
+              + (f", loaded {', '.join(heavy)}" if heavy else ''))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
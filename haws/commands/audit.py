@@ -0,0 +1,10 @@
+import click
+
+
+@click.command()
+def cli():
+    from haws.services.aws.policy_check import ensure_login, authenticated_snapshot
+    from haws.services.aws.iam_audit import run_iam_audit
+
+    ensure_login(save_runtime=True)
+    run_iam_audit(snapshot=authenticated_snapshot())
@@ -0,0 +1,20 @@
+import click
+
+
+@click.command()
+@click.argument('profiles', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output-dir', default='haws_batch', show_default=True,
+              help="directory that receives one sub-directory per profile and the batch report")
+@click.option('--workers', type=int, default=None,
+              help="number of profiles checked in parallel. Default: number of cores")
+@click.option('--write-config', is_flag=True, default=False,
+              help="whether to overwrite the scan config of each workspace")
+@click.option('--get-org', is_flag=True, default=False,
+              help="whether to pull the AWS organization of each profile")
+@click.option('--bulk-accounts', is_flag=True, default=False,
+              help="whether to discover accounts with one list_accounts sweep instead of one call per OU")
+def cli(profiles, output_dir, workers, write_config, get_org, bulk_accounts):
+    from haws.services.batch_helper import read_profiles, run_batch
+
+    run_batch(read_profiles(profiles), output_dir=output_dir, workers=workers,
+              get_org=get_org, write_config=write_config, bulk_accounts=bulk_accounts)
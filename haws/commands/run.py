@@ -1,11 +1,7 @@
 import click
 import os
 from os import path
-from haws.main import logger, runtime
-from haws.services.lx_api_connector import overwrite_scan_config
-from haws.services.aws.policy_check import run_policy_check
-from haws.services.aws.organization_check import run_org_check
-from haws.services.aws.cost_allocation_tags import run_cost_tag_check
+from haws.main import logger
 
 
 @click.command()
@@ -15,17 +11,104 @@ from haws.services.aws.cost_allocation_tags import run_cost_tag_check
               help="whether to overwrite the scan config to the workspace")
 @click.option('--get-org', is_flag=True, default=False,
               help="whether to pull the AWS organization")
-def cli(save_runtime, write_config, get_org):
-    run_policy_check(save_runtime=save_runtime)
-    run_cost_tag_check()
+@click.option('--bulk-accounts', is_flag=True, default=False,
+              help="whether to discover accounts with one list_accounts sweep instead of one call per OU")
+@click.option('--org-cache-ttl', type=int, default=None,
+              help="reuse the org snapshot cached by a previous run if it is younger than this many seconds")
+@click.option('--incremental', is_flag=True, default=False,
+              help="whether to refresh an expired org snapshot incrementally instead of traversing the org again")
+@click.option('--org-format', type=click.Choice(['arrow', 'pickle']), default='arrow',
+              help="file format of the saved org charts")
+@click.option('--tag-cache-ttl', type=int, default=None,
+              help="reuse cost allocation tags discovered by a previous run for this many seconds, 0 disables. Default: 21600")
+@click.option('--tag-coverage', is_flag=True, default=False,
+              help="whether to measure the share of spend each active cost allocation tag covers (one billed Cost Explorer query per tag, shared with --profile-tags)")
+@click.option('--profile-tags', is_flag=True, default=False,
+              help="whether to profile the values of every active cost allocation tag before the scan config is written (one billed Cost Explorer query per tag at about 4 per second, e.g. a minute for 200 tags; cached for --tag-cache-ttl)")
+@click.option('--report-format', 'report_formats', type=click.Choice(['text', 'json', 'ndjson', 'junit']),
+              multiple=True, default=['text'], show_default=True,
+              help="format of the check report, can be given several times")
+@click.option('--iam-snapshot', is_flag=True, default=False,
+              help="whether to read all IAM data from one get_account_authorization_details sweep")
+@click.option('--check-members', 'member_role', default=None, metavar='ROLE_NAME',
+              help="assume this role in every account of the scan config and verify its policies (requires --get-org)")
+@click.option('--member-workers', type=int, default=None,
+              help="number of member accounts verified in parallel. Default: 8")
+@click.option('--member-timeout', type=int, default=None,
+              help="seconds after which the verification of a member account is given up. Default: 60")
+def cli(save_runtime, write_config, get_org, bulk_accounts, org_cache_ttl, incremental, org_format,
+        tag_cache_ttl, tag_coverage, profile_tags, report_formats, iam_snapshot, member_role, member_workers, member_timeout):
+    # services pull in boto3 and pandas, so they are imported only once the
+    # command actually runs and `haws run --help` stays fast
+    from haws.services.runtime_helper import get_runtime_path
+    from haws.services.lx_api_connector import overwrite_scan_config
+    from haws.services.aws.policy_check import ensure_login, run_policy_check
+    from haws.services.aws.organization_check import run_org_check
+    from haws.services.aws.cost_allocation_tags import get_tags, create_tag_report, TAG_CACHE_TTL
+    from haws.services.aws.tag_coverage import cached_tag_spend, run_tag_coverage
+    from haws.services.aws.tag_profile import run_tag_profile
+    from haws.services.aws.member_account_check import run_member_check, MAX_MEMBER_WORKERS, MEMBER_TIMEOUT
+    from haws.services.aws.rate_limiter import save_limiter_stats
+    from haws.services.orchestrator import Phase, run_phases
+    from haws.services.report_sink import open_report, close_report
+
+    member_workers = member_workers or MAX_MEMBER_WORKERS
+    member_timeout = member_timeout or MEMBER_TIMEOUT
+    if tag_cache_ttl is None:
+        tag_cache_ttl = TAG_CACHE_TTL
+
+    # the login and its interactive setup fallback run on the main thread
+    # before any phase is scheduled, so no prompt or exit happens on a worker
+    login_info = ensure_login(save_runtime=save_runtime)
+
+    # the tag report appends to the report the policy check creates,
+    # so it waits for the policy phase
+    phases = [
+        Phase('policy', lambda: run_policy_check(
+            save_runtime=save_runtime, login_info=login_info, iam_snapshot=iam_snapshot)),
+        Phase('cost_tags', lambda: get_tags(ttl=tag_cache_ttl)),
+        Phase('tag_report', lambda policy, cost_tags: create_tag_report(
+            tags=cost_tags), depends_on=['policy', 'cost_tags'])
+    ]
+
+    if tag_coverage or profile_tags:
+        # the spend per tag value is queried once for the coverage and the
+        # profile; the coverage appends to the report after the tag list
+        phases.append(Phase('spend', lambda cost_tags: cached_tag_spend(
+            cost_tags or [], ttl=tag_cache_ttl), depends_on=['cost_tags']))
+
+    if tag_coverage:
+        phases.append(Phase('tag_coverage', lambda cost_tags, spend, tag_report: run_tag_coverage(
+            tags=cost_tags, spend=spend), depends_on=['cost_tags', 'spend', 'tag_report']))
+
+    if profile_tags:
+        phases.append(Phase('tag_profile', lambda cost_tags, spend: run_tag_profile(
+            tags=cost_tags, spend=spend), depends_on=['cost_tags', 'spend']))
 
     if get_org:
-        payload = run_org_check()
+        phases.append(Phase('org', lambda: run_org_check(
+            bulk_accounts=bulk_accounts, login_info=login_info, cache_ttl=org_cache_ttl,
+            incremental=incremental, output_format=org_format)))
+
+    if member_role and get_org:
+        phases.append(Phase('members', lambda org: run_member_check(
+            scan_config=org, role_name=member_role, max_workers=member_workers,
+            timeout=member_timeout), depends_on=['org']))
 
     if write_config and get_org:
-        overwrite_scan_config(scan_config=payload)
+        # high-cardinality tags are reported before the config is written
+        phases.append(Phase('write_config', lambda org, tag_profile=None: overwrite_scan_config(
+            scan_config=org), depends_on=['org'] + (['tag_profile'] if profile_tags else [])))
+
+    open_report(report_formats)
+    try:
+        run_phases(phases)
+    finally:
+        close_report()
+    save_limiter_stats()
 
     if not save_runtime:
+        runtime = get_runtime_path()
         if path.exists(runtime):
             os.remove(runtime)
             logger.info("[info]removed runtime config [/info]",
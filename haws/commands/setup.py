@@ -1,8 +1,9 @@
 import click
-from haws.services.setup_helper import setup_cli
 
 
 @click.command()
 @click.pass_context
 def cli(ctx):
+    from haws.services.setup_helper import setup_cli
+
     setup_cli()
@@ -1,55 +1,98 @@
+import atexit
 import click
-import os
 import io
 import logging
-import sys
-import datetime
-from rich.console import Console
-from rich.padding import Padding
-from rich.logging import RichHandler
-from rich.theme import Theme
-from pathlib import Path
-
-root_dir = str(Path(__file__).parent.absolute())
-runtime = root_dir + '/config/runtime.json'
-
-plugin_folder = os.path.join(os.path.dirname(__file__), 'commands')
+import os
+from importlib import import_module
+
 logger_config = os.path.dirname(__file__) + '/config/logger.ini'
 health_log = os.path.dirname(__file__) + '/services/healthcheck.log'
 
-logger_console = Console(theme=Theme().read(
-    logger_config), log_time_format='%b-%d-%y %H:%M:%S')
 logger = logging.getLogger(__name__)
-f_handler = logging.FileHandler(health_log, mode='w+')
-f_formatter = logging.Formatter(
-    '%(levelname)s-%(asctime)s - %(message)s - line %(lineno)d - %(filename)s', datefmt='%b-%d-%y %H:%M:%S')
 
-f_handler.setFormatter(f_formatter)
+# command name -> module providing its `cli`. modules are imported on first
+# use only, so `haws --help` never loads boto3, pandas or numpy.
+COMMANDS = {
+    'setup': 'haws.commands.setup',
+    'run': 'haws.commands.run',
+    'batch': 'haws.commands.batch',
+    'audit': 'haws.commands.audit'
+}
+
+LOG_FORMATS = ['rich', 'json']
+
+_listener = None
+_queue_handler = None
+_log_settings = None
+
+
+def stop_logging():
+    """
+        drains the log queue and closes the handlers.
+    """
+
+    global _listener, _queue_handler, _log_settings
+
+    if _listener is None:
+        return
+
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    logger.removeHandler(_queue_handler)
+    _listener, _queue_handler, _log_settings = None, None, None
+
 
-logger.addHandler(f_handler)
-logger.addHandler(RichHandler(console=logger_console, rich_tracebacks=True))
-logger.setLevel(logging.INFO)
+def setup_logging(log_format: str = None, log_file: str = None):
+    """
+        sends the logger through a queue to a background listener that owns
+        the file and console handlers, so worker threads never wait on
+        console I/O. runs when a command is invoked instead of at import time;
+        calling it again with other settings replaces the handlers.
+    """
+
+    global _listener, _queue_handler, _log_settings
+
+    log_format = log_format or os.getenv('HAWS_LOG_FORMAT', 'rich')
+    log_file = log_file or health_log
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f'unknown log format {log_format}, expected one of {LOG_FORMATS}')
+    if _log_settings == (log_format, log_file):
+        return
+
+    import queue
+    from logging.handlers import QueueListener
+    from haws.services.log_helper import LocalQueueHandler, log_handlers
+
+    stop_logging()
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = LocalQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, *log_handlers(log_format, log_file, logger_config))
+    _log_settings = (log_format, log_file)
+
+    logger.addHandler(_queue_handler)
+    logger.setLevel(logging.INFO)
+    _listener.start()
+
+
+atexit.register(stop_logging)
 
 
 class AWSScanner(click.MultiCommand):
 
     def list_commands(self, ctx):
-        rv = ['setup', 'run']
-        # for filename in os.listdir(plugin_folder):
-        #     if filename.endswith('.py') and not filename.startswith('__'):
-        #         rv.append(filename[:-3])
-        # rv.sort()
-        return rv
+        return list(COMMANDS)
 
     def get_command(self, ctx, name):
-        ns = {}
-        fn = os.path.join(plugin_folder, name + '.py')
-        with open(fn) as f:
-            code = compile(f.read(), fn, 'exec')
-            eval(code, ns, ns)
-        return ns['cli']
+        if name not in COMMANDS:
+            return None
+        # import_module caches the module in sys.modules
+        return import_module(COMMANDS[name]).cli
 
     def format_help(self, ctx, formatter):
+        from rich.console import Console
+
         sio = io.StringIO()
         console = Console(file=sio, force_terminal=True)
         console.print(
@@ -62,13 +105,41 @@ class AWSScanner(click.MultiCommand):
         console.print("[bold magenta] Commands",)
         for cmd in self.list_commands(ctx):
             console.print(f"[bold blue]{cmd} [/bold blue] ")
+        console.print("[bold magenta] Options",)
+        console.print("[bold blue]--log-format[/bold blue] rich | json")
+        console.print("[bold blue]--api-rate[/bold blue] SERVICE=RATE")
+        console.print("[bold blue]--max-api-rate[/bold blue] RATE")
         formatter.write(sio.getvalue())
 
 
+def validate_api_rates(ctx, param, value):
+    for item in value:
+        service, _, rate = item.partition('=')
+        try:
+            if not service or float(rate) <= 0:
+                raise ValueError
+        except ValueError:
+            raise click.BadParameter(f'{item!r} is not SERVICE=RATE, e.g. organizations=2')
+    return value
+
+
 @click.group(cls=AWSScanner)
+@click.option('--log-format', type=click.Choice(LOG_FORMATS), default='rich', envvar='HAWS_LOG_FORMAT',
+              help="rich console output or plain JSON lines")
+@click.option('--api-rate', 'api_rates', multiple=True, metavar='SERVICE=RATE', callback=validate_api_rates,
+              help="requests per second a service starts at, e.g. organizations=2, can be given several times")
+@click.option('--max-api-rate', type=click.FloatRange(min=0.5), default=None, envvar='HAWS_MAX_API_RATE',
+              help="requests per second no service is probed beyond. Default: 100")
 @click.pass_context
-def cli(ctx):
-    pass
+def cli(ctx, log_format, api_rates, max_api_rate):
+    # worker processes of `haws batch` read the format and the API rates
+    # from the environment
+    os.environ['HAWS_LOG_FORMAT'] = log_format
+    if api_rates:
+        os.environ['HAWS_API_RATES'] = ','.join(api_rates)
+    if max_api_rate is not None:
+        os.environ['HAWS_MAX_API_RATE'] = str(max_api_rate)
+    setup_logging(log_format=log_format)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,112 @@
+import json
+from fnmatch import fnmatchcase
+from typing import Iterable, List, Union
+
+# marks the end of a wildcard prefix in the trie
+WILDCARD = '*'
+
+
+def statements(document: Union[dict, str]) -> List[dict]:
+    if isinstance(document, str):
+        document = json.loads(document)
+
+    found = document.get('Statement', [])
+    if isinstance(found, dict):
+        found = [found]
+
+    return found
+
+
+def allowed_actions(document: Union[dict, str]) -> List[str]:
+    """
+        lists the actions of all Allow statements of a policy document.
+        Deny, NotAction and resource scoping are not evaluated.
+    """
+
+    actions = list()
+    for statement in statements(document):
+        if statement.get('Effect') != 'Allow':
+            continue
+        action = statement.get('Action', [])
+        if isinstance(action, str):
+            action = [action]
+        actions.extend(action)
+
+    return actions
+
+
+class ActionIndex:
+    """
+        the actions a policy grants, compiled for lookups.
+        exact actions are kept in a set, trailing wildcards such as
+        `ec2:Describe*` in a prefix trie and any other wildcard pattern in a
+        short list that is matched with fnmatch. IAM action names are not case
+        sensitive, so everything is lower-cased.
+    """
+
+    def __init__(self, actions: Iterable[str] = ()):
+        self.exact = set()
+        self.trie = dict()
+        self.patterns = list()
+
+        for action in actions:
+            self.add(action)
+
+    @classmethod
+    def from_document(cls, document: Union[dict, str]) -> 'ActionIndex':
+        return cls(allowed_actions(document))
+
+    def add(self, action: str):
+        action = action.lower()
+        self.exact.add(action)
+
+        if '*' not in action and '?' not in action:
+            return
+
+        prefix = action[:-1]
+        if action.endswith('*') and '*' not in prefix and '?' not in prefix:
+            node = self.trie
+            for char in prefix:
+                node = node.setdefault(char, dict())
+            node[WILDCARD] = True
+        else:
+            self.patterns.append(action)
+
+    def grants(self, action: str) -> bool:
+        """
+            whether `action` is granted. a wildcard `action` is only granted if
+            every action it stands for is, i.e. if the index contains the same
+            or a broader wildcard.
+        """
+
+        action = action.lower()
+        if action in self.exact:
+            return True
+
+        node = self.trie
+        if WILDCARD in node:
+            return True
+        for char in action:
+            node = node.get(char)
+            if node is None:
+                break
+            if WILDCARD in node:
+                return True
+
+        return any(fnmatchcase(action, pattern) for pattern in self.patterns)
+
+    def missing(self, actions: Iterable[str]) -> List[str]:
+        return [action for action in actions if not self.grants(action)]
+
+
+def missing_actions(required: Union[dict, str], attached: Union[dict, str]) -> List[str]:
+    """
+        lists the actions of the `required` policy document that the
+        `attached` policy document does not grant. an empty list means the
+        attached policy grants a superset of the required actions, regardless
+        of statement order, Sids or additional statements.
+    """
+
+    granted = ActionIndex.from_document(attached)
+
+    return granted.missing(dict.fromkeys(allowed_actions(required)))
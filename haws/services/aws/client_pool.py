@@ -0,0 +1,114 @@
+import threading
+import boto3
+from botocore.config import Config
+from haws.services.aws.rate_limiter import register_limiter
+
+# boto3 sessions are not thread-safe, clients are. sessions and clients are
+# therefore created once under a lock and the clients are shared by all
+# worker threads of the process.
+# request rates are adapted by haws.services.aws.rate_limiter across all
+# clients, so botocore's per-client adaptive mode would only back off twice.
+MAX_POOL_CONNECTIONS = 25
+RETRY_MODE = 'standard'
+MAX_ATTEMPTS = 10
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+
+_lock = threading.RLock()
+_sessions = dict()
+_clients = dict()
+_config = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    retries={'mode': RETRY_MODE, 'max_attempts': MAX_ATTEMPTS},
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT
+)
+
+
+def configure(max_pool_connections: int = MAX_POOL_CONNECTIONS, retry_mode: str = RETRY_MODE,
+              max_attempts: int = MAX_ATTEMPTS, connect_timeout: int = CONNECT_TIMEOUT,
+              read_timeout: int = READ_TIMEOUT):
+    """
+        sets the botocore config used for all pooled clients.
+        clients created with the previous config are dropped.
+    """
+
+    global _config
+
+    with _lock:
+        _config = Config(
+            max_pool_connections=max_pool_connections,
+            retries={'mode': retry_mode, 'max_attempts': max_attempts},
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout
+        )
+        _clients.clear()
+
+
+def get_session() -> boto3.Session:
+    """
+        returns the process-wide session. it loads the service models once;
+        clients with explicit credentials are created from it as well.
+    """
+
+    with _lock:
+        session = _sessions.get('default')
+        if session is None:
+            session = boto3.Session()
+            _sessions['default'] = session
+
+    return session
+
+
+def create_client(service_name: str, aws_access_key_id: str = None, aws_secret_access_key: str = None,
+                  aws_session_token: str = None, region_name: str = None, config: Config = None):
+    """
+        creates a rate-limited client from the shared session without pooling
+        it, e.g. for short-lived credentials or a client-specific `config`.
+    """
+
+    with _lock:
+        client = get_session().client(
+            service_name, region_name=region_name, config=config or _config,
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            aws_session_token=aws_session_token)
+        # resolves the default credential chain once per session
+        credential = aws_access_key_id or getattr(get_session().get_credentials(), 'access_key', None)
+
+    register_limiter(client, credential=credential)
+
+    return client
+
+
+def get_client(service_name: str, aws_access_key_id: str = None, aws_secret_access_key: str = None,
+               aws_session_token: str = None, region_name: str = None):
+    """
+        returns the pooled client for a service and set of credentials,
+        creating it on first use. without explicit credentials the default
+        credential chain (env, profile, ...) is used.
+    """
+
+    key = (service_name, region_name, aws_access_key_id, aws_session_token)
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = create_client(
+                service_name, aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                aws_session_token=aws_session_token, region_name=region_name)
+            _clients[key] = client
+
+    return client
+
+
+def reset():
+    """
+        drops all pooled sessions and clients, e.g. after the credentials in
+        the environment changed.
+    """
+
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
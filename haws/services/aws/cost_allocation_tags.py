@@ -1,58 +1,151 @@
-import boto3
 from haws.exceptions.authentication import UnauthenticatedUserCredentials
 from haws.main import logger
+from haws.services.aws.client_pool import get_client
+from haws.services.aws.identity_cache import caller_identity
+from haws.services.aws.pagination import iter_token_pages
+from haws.services.runtime_helper import cache_dir
+from haws.services.report_sink import get_report
 from datetime import datetime as dt
 from dateutil.relativedelta import relativedelta
 import botocore
+import json
 import os
-from rich.console import Console
-from typing import List
+import time
+from typing import Iterator, List
 
+# tag activation changes rarely and every get_tags call is billed,
+# so a discovery is reused for this many seconds
+TAG_CACHE_TTL = 6 * 60 * 60
+
+
+def tag_cache_path(account_id: str, kind: str = 'cost_tags') -> str:
+    return os.path.join(cache_dir, f'{kind}_{account_id}.json')
+
+
+def load_cached_tags(account_id: str, ttl: int, kind: str = 'cost_tags') -> dict:
+    """
+        :returns dict: the cached `kind` of data of the account with its
+        `created` time; None if there is none younger than `ttl` seconds.
+    """
+
+    file_path = tag_cache_path(account_id, kind)
+    if ttl <= 0 or not os.path.exists(file_path):
+        return None
 
-def get_tags():
     try:
-        ce = boto3.client('ce')
-        today = dt.today()
-        backdate = today + relativedelta(months=-6)
-        backdate = backdate.strftime('%Y-%m-%d')
-        today = today.strftime('%Y-%m-%d')
-
-        tags = ce.get_tags(
-            SearchString='',
-            TimePeriod={
-                'Start': backdate,
-                'End': today
-            }
-        )['Tags']
-
-        logger.info(f'found {len(tags)} active cost allocation tag(s)', extra={
+        with open(file_path, 'r') as fh:
+            cached = json.load(fh)
+    except (OSError, ValueError):
+        logger.warning(f'ignoring unreadable tag cache {file_path}')
+        return None
+
+    if time.time() - cached['created'] > ttl:
+        return None
+    return cached
+
+
+def save_cached_tags(account_id: str, data: dict, kind: str = 'cost_tags'):
+    os.makedirs(cache_dir, exist_ok=True)
+    file_path = tag_cache_path(account_id, kind)
+    cached = dict(data, account_id=account_id, created=time.time())
+
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(cached, fh)
+    os.replace(tmp_path, file_path)
+
+
+def cost_window(months: int = 6) -> dict:
+    """
+        :returns dict: the Cost Explorer `TimePeriod` of the last `months` months
+    """
+
+    today = dt.today()
+    backdate = today + relativedelta(months=-months)
+    return {'Start': backdate.strftime('%Y-%m-%d'), 'End': today.strftime('%Y-%m-%d')}
+
+
+def iter_allocation_tags(ce) -> Iterator[dict]:
+    """
+        yields every cost allocation tag with its real activation status.
+        free of charge, unlike the Cost Explorer queries.
+    """
+
+    for page in iter_token_pages(ce, 'list_cost_allocation_tags', MaxResults=1000):
+        for tag in page['CostAllocationTags']:
+            yield {'TagKey': tag['TagKey'], 'Type': tag.get('Type'), 'Status': tag['Status']}
+
+
+def iter_tags_with_costs(ce, months: int = 6) -> Iterator[dict]:
+    """
+        fallback for botocore versions and roles without
+        list_cost_allocation_tags: yields the tags that carried costs in the
+        last `months` months, page by page of the billed `ce.get_tags`.
+        activation status is unknown here, the tags are reported as active.
+    """
+
+    pages = iter_token_pages(ce, 'get_tags', token_key='NextPageToken', SearchString='',
+                             TimePeriod=cost_window(months))
+    for page in pages:
+        for tag in page['Tags']:
+            yield {'TagKey': tag, 'Type': None, 'Status': 'Active'}
+
+
+def discover_tags(ce) -> tuple:
+    """
+        :returns tuple: the source used and all discovered tags
+    """
+
+    try:
+        return 'list_cost_allocation_tags', list(iter_allocation_tags(ce))
+    except AttributeError:
+        logger.info('botocore does not know list_cost_allocation_tags, falling back to get_tags')
+    except botocore.exceptions.ClientError as e:
+        logger.warning(
+            f'list_cost_allocation_tags failed ({e.response["Error"]["Code"]}), falling back to get_tags')
+
+    return 'get_tags', list(iter_tags_with_costs(ce))
+
+
+def get_tags(ttl: int = TAG_CACHE_TTL):
+    """
+        :returns list: the keys of the active cost allocation tags; None if
+        Cost Explorer cannot be queried.
+        discoveries are cached per account for `ttl` seconds, 0 disables it.
+    """
+
+    try:
+        account_id = caller_identity()['Account']
+        cached = load_cached_tags(account_id, ttl)
+        if cached is None:
+            source, tags = discover_tags(get_client('ce'))
+            save_cached_tags(account_id, {'source': source, 'tags': tags})
+        else:
+            source, tags = cached['source'], cached['tags']
+            logger.info(f'using cost allocation tags cached at {tag_cache_path(account_id)}')
+
+        active = [tag['TagKey'] for tag in tags if tag['Status'] == 'Active']
+
+        logger.info(f'found {len(active)} active cost allocation tag(s) of {len(tags)} via {source}', extra={
                     "markup": True})
-        return tags
+        return active
     except botocore.exceptions.ClientError as e:
         print(e)
         return None
 
 
 def create_tag_report(tags: List[str]):
-    num_healthchecks = 0
-    cwd = os.getcwd()
-    filename = cwd+'/report.txt'
-    failed_checks = 0
-    passed_checks = 0
-
-    with open(filename, 'a') as fh:
-        console = Console(file=fh, width=75)
-        console.print('\n')
-        console.rule("Active Cost Allocation Tags")
-
-        for index, tag in enumerate(tags):
+    report = get_report()
+
+    with report.section('cost_tags', 'Active Cost Allocation Tags') as section:
+        for index, tag in enumerate(tags or []):
             index += 1
-            console.print(f'{index}: [bold white] {tag} [/bold white] ')
-    
-    logger.info(f'saved cost allocation report {filename}', extra={
+            section.write(tag, 'info', f'{index}: {tag}')
+
+    logger.info(f'saved cost allocation report {", ".join(report.paths.values())}', extra={
                     "markup": True})
 
 
-def run_cost_tag_check():
-    tags = get_tags()
+def run_cost_tag_check(ttl: int = TAG_CACHE_TTL):
+    tags = get_tags(ttl=ttl)
     create_tag_report(tags=tags)
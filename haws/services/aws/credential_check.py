@@ -1,4 +1,3 @@
-import boto3
 import botocore
 import json
 import re
@@ -6,9 +5,10 @@ import click
 import os
 from haws.main import logger
 from os import path
-from haws.main import runtime
 from rich.prompt import Prompt
-from haws.services.runtime_helper import get_runtime_settings
+from haws.services.runtime_helper import get_runtime_settings, get_runtime_path
+from haws.services.aws.client_pool import reset as reset_client_pool
+from haws.services.aws.identity_cache import caller_identity
 from pathlib import Path
 from haws.exceptions.authentication import InvalidUserCredentials, NoRuntimeSettings,GeneralAuthError
 
@@ -25,17 +25,18 @@ def get_user_credentials():
 
 def verify_credentials(aws_access_key_id: str, aws_secret_access_key: str, extended: bool = False):
     pattern = re.compile('user/(.*)')
-    sts = boto3.client('sts',
-                       aws_access_key_id=aws_access_key_id,
-                       aws_secret_access_key=aws_secret_access_key)
 
     try:
-        res = sts.get_caller_identity()
+        # later logins of the run, e.g. by the org check, hit the cache
+        res = caller_identity(aws_access_key_id=aws_access_key_id,
+                              aws_secret_access_key=aws_secret_access_key)
         if (not os.getenv('AWS_ACCESS_KEY_ID')) or (not os.getenv('AWS_SECRET_ACCESS_KEY')):
             logger.info("[info]credentials are valid[/info]",
                     extra={"markup": True})
             os.environ['AWS_ACCESS_KEY_ID'] = aws_access_key_id
             os.environ['AWS_SECRET_ACCESS_KEY'] = aws_secret_access_key
+            # pooled default clients may still hold the previous credentials
+            reset_client_pool()
             
         if not extended:
             return True
@@ -75,6 +76,7 @@ def verify_credentials(aws_access_key_id: str, aws_secret_access_key: str, exten
 
 
 def login():
+    runtime = get_runtime_path()
     if not path.exists(runtime):
         print(runtime)
         logger.error('[danger]Did not find any runtime config.', extra={
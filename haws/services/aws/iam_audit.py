@@ -0,0 +1,116 @@
+import os
+import pandas as pd
+from haws.main import logger
+from haws.services.aws.client_pool import get_client
+from haws.services.aws.iam_snapshot import IAMSnapshot
+from haws.services.aws.policy_cache import get_policy_document
+from haws.services.aws.policy_requirements import RequirementsIndex, get_requirements_index
+
+PRINCIPAL_COLUMNS = ['principal_type', 'principal_name', 'principal_arn']
+
+
+def principal_policies(snapshot: IAMSnapshot) -> pd.DataFrame:
+    """
+        one row per managed policy attached to a user, directly or through a
+        group, or to a role.
+    """
+
+    rows = list()
+    for name, user in snapshot.users.items():
+        for policy_arn in snapshot.user_policies(name) + snapshot.group_policies(name):
+            rows.append(('user', name, user['Arn'], policy_arn))
+    for name, role in snapshot.roles.items():
+        for policy_arn in snapshot.role_policies(name):
+            rows.append(('role', name, role['Arn'], policy_arn))
+
+    return pd.DataFrame(rows, columns=PRINCIPAL_COLUMNS + ['policy_arn'])
+
+
+def principals(snapshot: IAMSnapshot) -> pd.DataFrame:
+    rows = [('user', name, user['Arn']) for name, user in snapshot.users.items()]
+    rows += [('role', name, role['Arn']) for name, role in snapshot.roles.items()]
+
+    return pd.DataFrame(rows, columns=PRINCIPAL_COLUMNS).set_index('principal_arn')
+
+
+def policy_compliance(policy_arns, snapshot: IAMSnapshot, index: RequirementsIndex) -> pd.DataFrame:
+    """
+        checks every distinct attached policy once: which LeanIX requirement it
+        matches by name and whether it grants the required actions.
+    """
+
+    iam = get_client('iam')
+    rows = list()
+    for policy_arn in policy_arns:
+        requirement = index.match(policy_arn)
+        if requirement is None:
+            continue
+
+        document = snapshot.policy_document(policy_arn)
+        if document is None:
+            document = get_policy_document(iam, policy_arn)
+
+        compliant = len(requirement.missing_actions(document)) == 0
+        rows.append((policy_arn, requirement.name, compliant))
+
+    return pd.DataFrame(rows, columns=['policy_arn', 'requirement', 'compliant'])
+
+
+def audit_principals(snapshot: IAMSnapshot, index: RequirementsIndex = None) -> pd.DataFrame:
+    """
+        checks every IAM user and role of the snapshot against the LeanIX
+        policy requirements. policies are evaluated once each and joined onto
+        the principals, so the cost does not grow with per-principal calls.
+
+        :returns pd.DataFrame: one row per principal, one boolean column per
+        requirement, `missing` and `scan_agent_ready`.
+    """
+
+    if index is None:
+        index = get_requirements_index()
+    requirement_names = list(index.by_name)
+
+    attachments = principal_policies(snapshot)
+    compliance = policy_compliance(
+        attachments['policy_arn'].unique(), snapshot, index)
+    # an empty compliance frame has an object column, which would select
+    # columns instead of rows
+    granted = attachments.merge(
+        compliance.loc[compliance['compliant'].astype(bool)], on='policy_arn')
+
+    audited = principals(snapshot)
+    if len(granted) == 0:
+        # no attached policy matches a requirement: nobody is ready
+        satisfied = pd.DataFrame(False, index=audited.index, columns=requirement_names)
+    else:
+        satisfied = pd.crosstab(granted['principal_arn'], granted['requirement']) > 0
+        satisfied = satisfied.reindex(
+            index=audited.index, columns=requirement_names, fill_value=False).astype(bool)
+
+    result = audited.join(satisfied)
+    result['missing'] = (~satisfied).dot(
+        pd.Index(requirement_names) + ', ').str.rstrip(', ')
+    result['scan_agent_ready'] = satisfied.all(axis=1)
+
+    return result.reset_index()
+
+
+def run_iam_audit(snapshot: IAMSnapshot = None) -> pd.DataFrame:
+    if snapshot is None:
+        snapshot = IAMSnapshot.fetch()
+
+    result = audit_principals(snapshot)
+
+    cwd = os.getcwd()
+    file_path = cwd+'/iam_audit.csv'
+    result.to_csv(file_path, index=False)
+
+    ready = result[result['scan_agent_ready']]
+    logger.info(
+        f'[bold]{len(ready)}/{len(result)} principals could act as the LeanIX scan agent[/bold]', extra={"markup": True})
+    for _, principal in ready.iterrows():
+        logger.info(
+            f'[bold green]{principal["principal_type"]}[/bold green] {principal["principal_arn"]}', extra={"markup": True})
+    logger.info(f'saved IAM audit @ {file_path}')
+
+    return result
@@ -0,0 +1,86 @@
+import json
+from typing import List
+from urllib.parse import unquote
+from haws.main import logger
+from haws.services.aws.client_pool import get_client
+from haws.services.aws.pagination import iter_pages
+
+SNAPSHOT_FILTER = ['User', 'Group', 'Role',
+                   'LocalManagedPolicy', 'AWSManagedPolicy']
+
+
+class IAMSnapshot:
+    """
+        in-memory view of the users, groups, roles and managed policies of an
+        account, taken with one paginated get_account_authorization_details
+        sweep. answers the questions of the policy check without further
+        IAM calls.
+    """
+
+    def __init__(self, users: List[dict], groups: List[dict], roles: List[dict], policies: List[dict]):
+        self.users = {user['UserName']: user for user in users}
+        self.groups = {group['GroupName']: group for group in groups}
+        self.roles = {role['RoleName']: role for role in roles}
+        self.policies = {policy['Arn']: policy for policy in policies}
+
+    @classmethod
+    def fetch(cls, iam=None) -> 'IAMSnapshot':
+        if iam is None:
+            iam = get_client('iam')
+
+        users, groups, roles, policies = list(), list(), list(), list()
+        pages = 0
+        for page in iter_pages(iam, 'get_account_authorization_details', Filter=SNAPSHOT_FILTER):
+            users.extend(page.get('UserDetailList', []))
+            groups.extend(page.get('GroupDetailList', []))
+            roles.extend(page.get('RoleDetailList', []))
+            policies.extend(page.get('Policies', []))
+            pages += 1
+
+        logger.info(
+            f'[info]IAM snapshot: {len(users)} user(s), {len(groups)} group(s), {len(roles)} role(s), {len(policies)} managed policies in {pages} page(s)[/info]', extra={"markup": True})
+
+        return cls(users=users, groups=groups, roles=roles, policies=policies)
+
+    def user_policies(self, username: str) -> List[str]:
+        user = self.users.get(username, {})
+        return [policy['PolicyArn'] for policy in user.get('AttachedManagedPolicies', [])]
+
+    def user_groups(self, username: str) -> List[str]:
+        return list(self.users.get(username, {}).get('GroupList', []))
+
+    def group_policies(self, username: str) -> List[str]:
+        """
+            the managed policies attached to the groups a user belongs to.
+        """
+
+        group_policies = list()
+        for group_name in self.user_groups(username):
+            group = self.groups.get(group_name, {})
+            group_policies.extend(
+                policy['PolicyArn'] for policy in group.get('AttachedManagedPolicies', []))
+
+        return group_policies
+
+    def role_policies(self, role_name: str) -> List[str]:
+        role = self.roles.get(role_name, {})
+        return [policy['PolicyArn'] for policy in role.get('AttachedManagedPolicies', [])]
+
+    def policy_document(self, policy_arn: str) -> dict:
+        """
+            :returns dict: the default version document of a managed policy,
+            None if the policy is not part of the snapshot.
+        """
+
+        policy = self.policies.get(policy_arn)
+        if policy is None:
+            return None
+
+        for version in policy.get('PolicyVersionList', []):
+            if version.get('IsDefaultVersion'):
+                document = version['Document']
+                if isinstance(document, str):
+                    document = json.loads(unquote(document))
+                return document
+
+        return None
@@ -0,0 +1,121 @@
+import datetime
+import hashlib
+import os
+import threading
+import time
+from haws.services.aws.client_pool import get_client, get_session
+
+# caller identity and organization metadata do not change during a run.
+# entries are keyed by the credentials they were fetched with and expire
+# after this many seconds or when those credentials expire, if earlier.
+IDENTITY_TTL = 15 * 60
+
+_lock = threading.Lock()
+_entries = dict()
+_pending = dict()
+
+
+def credentials_key(aws_access_key_id: str = None, aws_secret_access_key: str = None,
+                    aws_session_token: str = None) -> tuple:
+    """
+        identifies a set of credentials without keeping the secret in memory.
+        without explicit credentials the default credential chain is resolved.
+    """
+
+    if aws_access_key_id is None:
+        credentials = get_session().get_credentials()
+        if credentials is None:
+            return (None, None)
+        credentials = credentials.get_frozen_credentials()
+        aws_access_key_id = credentials.access_key
+        aws_secret_access_key = credentials.secret_key
+        aws_session_token = credentials.token
+
+    digest = hashlib.sha256(
+        f'{aws_secret_access_key}:{aws_session_token}'.encode()).hexdigest()
+    return (aws_access_key_id, digest)
+
+
+def expiry(ttl: int, expiration=None) -> float:
+    expires = time.time() + ttl
+    if isinstance(expiration, datetime.datetime):
+        expires = min(expires, expiration.timestamp())
+    return expires
+
+
+def cached(name: str, key: tuple, fetch, ttl: int = IDENTITY_TTL, expiration=None):
+    """
+        returns the cached result of `fetch()` for `name` and the credentials
+        `key`. concurrent callers for the same entry wait for the first one
+        instead of calling the API again; errors are not cached.
+    """
+
+    entry_key = (name,) + key
+
+    while True:
+        with _lock:
+            entry = _entries.get(entry_key)
+            if entry is not None and entry[0] > time.time():
+                return entry[1]
+            event = _pending.get(entry_key)
+            if event is None:
+                event = threading.Event()
+                _pending[entry_key] = event
+                break
+        event.wait()
+
+    try:
+        value = fetch()
+        with _lock:
+            _entries[entry_key] = (expiry(ttl, expiration), value)
+        return value
+    finally:
+        with _lock:
+            del _pending[entry_key]
+        event.set()
+
+
+def caller_identity(aws_access_key_id: str = None, aws_secret_access_key: str = None,
+                    aws_session_token: str = None, expiration=None) -> dict:
+    """
+        memoized `sts.get_caller_identity`.
+        :param expiration: datetime at which temporary credentials expire
+    """
+
+    credentials = {
+        'aws_access_key_id': aws_access_key_id,
+        'aws_secret_access_key': aws_secret_access_key,
+        'aws_session_token': aws_session_token
+    }
+
+    def fetch():
+        response = get_client('sts', **credentials).get_caller_identity()
+        return {key: response[key] for key in ('UserId', 'Account', 'Arn')}
+
+    return cached('caller_identity', credentials_key(**credentials), fetch, expiration=expiration)
+
+
+def organization_details() -> dict:
+    """
+        memoized `organizations.describe_organization` for the default
+        credentials.
+    """
+
+    return cached('organization', credentials_key(),
+                  lambda: get_client('organizations').describe_organization()['Organization'])
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def _reset_after_fork():
+    # a forked worker may inherit the lock while a parent thread holds it
+    global _lock, _pending
+    _lock = threading.Lock()
+    _pending = dict()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,180 @@
+import os
+import time
+import botocore
+import pandas as pd
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
+from typing import List
+from haws.main import logger
+from haws.services.aws.client_pool import create_client
+from haws.services.aws.rate_limiter import release as release_limiter
+from haws.services.aws.pagination import paginate
+from haws.services.aws.policy_check import filter_policies, get_policy_permissions, compare_with_leanix
+
+# AssumeRole and IAM are account-wide APIs with low rate limits; every member
+# account costs a handful of calls, so a few workers already saturate them
+MAX_MEMBER_WORKERS = 8
+MEMBER_TIMEOUT = 60
+POLL_INTERVAL = 1
+# a request of a member check gives up quickly, so a timed out worker does
+# not run for long after its account was reported
+MEMBER_CONFIG = Config(
+    retries={'mode': 'standard', 'max_attempts': 2},
+    connect_timeout=5,
+    read_timeout=10
+)
+
+RESULT_COLUMNS = ['account_id', 'status', 'passed_checks',
+                  'num_healthchecks', 'failed_policies', 'duration', 'error']
+
+
+def check_deadline(deadline: float, **kwargs):
+    if time.monotonic() > deadline:
+        raise TimeoutError('member check ran past its timeout')
+
+
+def assume_member_role(sts, account_id: str, role_name: str) -> dict:
+    return sts.assume_role(
+        RoleArn=f'arn:aws:iam::{account_id}:role/{role_name}',
+        RoleSessionName='haws-member-check')['Credentials']
+
+
+def check_member_account(sts, account_id: str, role_name: str, deadline: float = None) -> dict:
+    """
+        assumes `role_name` in a member account and runs the policy
+        verification for the policies attached to that role. the IAM client
+        of the assumed role is not pooled, it is dropped with the check; no
+        further request is sent once `deadline` (monotonic time) has passed.
+    """
+
+    start = time.perf_counter()
+    credentials = assume_member_role(sts, account_id, role_name)
+    try:
+        iam = create_client('iam', config=MEMBER_CONFIG,
+                            aws_access_key_id=credentials['AccessKeyId'],
+                            aws_secret_access_key=credentials['SecretAccessKey'],
+                            aws_session_token=credentials['SessionToken'])
+        if deadline is not None:
+            iam.meta.events.register('before-call', partial(check_deadline, deadline))
+
+        role_policies = [policy['PolicyArn'] for policy in paginate(
+            iam, 'list_attached_role_policies', 'AttachedPolicies', RoleName=role_name)]
+        filtered_policies = filter_policies(policies=role_policies)
+        permissions = get_policy_permissions(filtered_policies, iam=iam)
+        policy_checks = compare_with_leanix(permissions)
+
+        mandatory = {policy: data for policy,
+                     data in policy_checks.items() if data['mandatory']}
+        failed = [policy for policy, data in mandatory.items()
+                  if not (data['exists'] and data['permission_check'])]
+
+        return {
+            'account_id': account_id,
+            'status': 'passed' if len(failed) == 0 else 'failed',
+            'passed_checks': len(mandatory) - len(failed),
+            'num_healthchecks': len(mandatory),
+            'failed_policies': ', '.join(failed),
+            'duration': time.perf_counter() - start,
+            'error': None
+        }
+    finally:
+        # the member's buckets are not needed once its check is done
+        release_limiter(credentials['AccessKeyId'])
+
+
+def timed_member_check(sts, account_id: str, role_name: str, started: dict, timeout: int) -> dict:
+    started[account_id] = time.monotonic()
+    return check_member_account(sts, account_id, role_name,
+                                deadline=started[account_id] + timeout)
+
+
+def error_result(account_id: str, status: str, error: str) -> dict:
+    return {
+        'account_id': account_id,
+        'status': status,
+        'passed_checks': 0,
+        'num_healthchecks': 0,
+        'failed_policies': None,
+        'duration': None,
+        'error': error
+    }
+
+
+def check_member_accounts(account_ids: List[str], role_name: str,
+                          max_workers: int = MAX_MEMBER_WORKERS,
+                          timeout: int = MEMBER_TIMEOUT) -> pd.DataFrame:
+    """
+        verifies the scan agent role in all member accounts, at most
+        `max_workers` at a time. an account that takes longer than `timeout`
+        seconds from its start is reported as `timeout`. its worker thread
+        cannot be interrupted: it sends no further request and its current
+        one gives up within MEMBER_CONFIG's timeouts, which the interpreter
+        still waits for at exit.
+    """
+
+    started = dict()
+    results = list()
+    sts = create_client('sts', config=MEMBER_CONFIG)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {executor.submit(timed_member_check, sts, account_id, role_name, started, timeout): account_id
+               for account_id in account_ids}
+
+    try:
+        while len(pending) != 0:
+            done, _ = wait(pending, timeout=POLL_INTERVAL,
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                account_id = pending.pop(future)
+                try:
+                    results.append(future.result())
+                except botocore.exceptions.ClientError as e:
+                    results.append(error_result(
+                        account_id, 'error', e.response['Error']['Code']))
+                except TimeoutError:
+                    results.append(error_result(
+                        account_id, 'timeout', f'no result after {timeout}s'))
+                except Exception as e:
+                    results.append(error_result(account_id, 'error', repr(e)))
+
+            now = time.monotonic()
+            for future, account_id in list(pending.items()):
+                if account_id in started and now - started[account_id] > timeout:
+                    del pending[future]
+                    results.append(error_result(
+                        account_id, 'timeout', f'no result after {timeout}s'))
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    return pd.DataFrame(results, columns=RESULT_COLUMNS).sort_values('account_id')
+
+
+def run_member_check(scan_config: List[dict], role_name: str,
+                     max_workers: int = MAX_MEMBER_WORKERS,
+                     timeout: int = MEMBER_TIMEOUT) -> pd.DataFrame:
+    """
+        verifies the accounts of the scan config built by get_relevant_accounts
+        and saves the results to member_accounts.csv.
+    """
+
+    account_ids = list(dict.fromkeys(
+        str(account['data']['SubscriptionID']) for account in scan_config))
+    logger.info(
+        f'[info]verifying role {role_name} in {len(account_ids)} account(s)[/info]', extra={"markup": True})
+
+    results = check_member_accounts(
+        account_ids, role_name, max_workers=max_workers, timeout=timeout)
+
+    cwd = os.getcwd()
+    file_path = cwd+'/member_accounts.csv'
+    results.to_csv(file_path, index=False)
+
+    counts = results['status'].value_counts()
+    logger.info(
+        f'[bold]member accounts: {counts.get("passed", 0)} passed, {counts.get("failed", 0)} failed, {counts.get("error", 0)} errors, {counts.get("timeout", 0)} timed out[/bold]', extra={"markup": True})
+    logger.info(f'saved member account checks @ {file_path}')
+
+    return results
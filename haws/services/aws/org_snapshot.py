@@ -0,0 +1,65 @@
+import json
+import os
+import time
+import pandas as pd
+from haws.main import logger
+from haws.services.runtime_helper import cache_dir
+
+# the traversed org is reused without any API calls for this many seconds
+SNAPSHOT_TTL = 24 * 60 * 60
+
+
+def snapshot_path(root_id: str) -> str:
+    return os.path.join(cache_dir, f'org_snapshot_{root_id}.json')
+
+
+def save_snapshot(root_id: str, ou_chart: pd.DataFrame, account_map: pd.DataFrame,
+                  created: float = None):
+    """
+        stores the traversed OUs and the account mapping of an org in the
+        local cache, column by column. `created` keeps the age of a snapshot
+        whose account parents were reused rather than looked up again.
+    """
+
+    os.makedirs(cache_dir, exist_ok=True)
+    file_path = snapshot_path(root_id)
+    snapshot = {
+        'root_id': root_id,
+        'created': time.time() if created is None else created,
+        'ou_chart': ou_chart.to_dict(orient='list'),
+        'accounts': account_map.to_dict(orient='list')
+    }
+
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(snapshot, fh)
+    os.replace(tmp_path, file_path)
+
+    logger.info(f'saved org snapshot @ {file_path}')
+
+
+def load_snapshot(root_id: str) -> dict:
+    """
+        :returns dict: with `root_id`, `created`, `ou_chart` and `accounts` as
+        DataFrames; None if there is no readable snapshot for the root.
+    """
+
+    file_path = snapshot_path(root_id)
+    if not os.path.exists(file_path):
+        return None
+
+    try:
+        with open(file_path, 'r') as fh:
+            snapshot = json.load(fh)
+    except (OSError, ValueError):
+        logger.warning(f'ignoring unreadable org snapshot {file_path}')
+        return None
+
+    snapshot['ou_chart'] = pd.DataFrame(snapshot['ou_chart'])
+    snapshot['accounts'] = pd.DataFrame(snapshot['accounts'])
+
+    return snapshot
+
+
+def snapshot_age(snapshot: dict) -> float:
+    return time.time() - snapshot['created']
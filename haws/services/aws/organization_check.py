@@ -1,25 +1,42 @@
-import boto3
 import json
 import pandas as pd
 import botocore
-from typing import List
+from typing import Iterator, List
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import click
 import numpy as np
+import pyarrow.feather as feather
 from haws.main import logger
 from haws.exceptions.authentication import AccessDenied
 from haws.services.aws.credential_check import login
 from haws.services.lx_api_connector import overwrite_scan_config
 from haws.exceptions.authentication import MultipleRoots
-from haws.services.setup_helper import update_runtime_settings
+from haws.services.runtime_helper import get_runtime_settings, update_runtime_settings
 from haws.exceptions.billing import *
 import os
-from haws.services.setup_helper import get_runtime_settings
+from haws.services.frame_helper import ColumnBuffer
+from haws.services.aws.pagination import paginate
+from haws.services.aws.client_pool import get_client
+from haws.services.aws.identity_cache import organization_details
+from haws.services.aws.org_snapshot import SNAPSHOT_TTL, load_snapshot, save_snapshot, snapshot_age
 
+# AWS Organizations throttles at a few requests per second per account,
+# so the traversal never keeps more calls than this in flight.
+MAX_ORG_WORKERS = 4
 
-def get_org_details() -> dict:
-    org = boto3.client('organizations')
+OU_COLUMNS = ['parent_id', 'child_id', 'child_name', 'child_arn']
+ACCOUNT_COLUMNS = ['parent_id', 'account_id',
+                   'account_arn', 'account_email', 'account_name']
+
+# org charts are written as uncompressed Arrow IPC (feather v2) files by
+# default; pickles are kept as an opt-in for older tooling
+ORG_OUTPUT_FORMAT = 'arrow'
+OUTPUT_EXTENSIONS = {'arrow': '.arrow', 'pickle': '.pkl'}
 
-    org_details = org.describe_organization()['Organization']
+
+def get_org_details() -> dict:
+    org_details = organization_details()
 
     billing_ac = org_details['MasterAccountId']
     billing_ac_arn = org_details['MasterAccountArn']
@@ -80,87 +97,146 @@ def is_billing_account(account_id: str):
     return out
 
 
-def get_parents(parents: List[str], df: pd.DataFrame):
-    org = boto3.client('organizations')
-    org_chart = dict()
+def iter_roots(org) -> Iterator[dict]:
+    return paginate(org, 'list_roots', 'Roots')
 
-    for parent in parents:
-        collector = list()
-        ous = org.list_organizational_units_for_parent(
-            ParentId=parent)['OrganizationalUnits']
 
-        if len(ous) != 0:  # only if children exist
-            for child in ous:
-                ou_name = child['Name']
-                ou_id = child['Id']
-                ou_arn = child['Arn']
+def iter_child_ous(org, parent: str) -> Iterator[dict]:
+    return paginate(org, 'list_organizational_units_for_parent',
+                    'OrganizationalUnits', ParentId=parent)
+
+
+def iter_accounts_for_parent(org, parent: str) -> Iterator[dict]:
+    return paginate(org, 'list_accounts_for_parent',
+                    'Accounts', ParentId=parent)
+
 
-                package = {
-                    'parent_id': parent,
-                    'child_id': ou_id,
-                    'child_name': ou_name,
-                    'child_arn': ou_arn
-                }
-                df = df.append(package, ignore_index=True)
-                collector.append(ou_id)
+def iter_accounts(org) -> Iterator[dict]:
+    return paginate(org, 'list_accounts', 'Accounts')
 
-            org_chart[parent] = collector
 
-    return df, org_chart
+def list_active_accounts(org) -> List[dict]:
+    return [account for account in iter_accounts(org)
+            if account['Status'] == "ACTIVE"]
 
 
-def traverse_ous(root_id: str):
+def list_child_ous(org, parent: str) -> List[dict]:
+    # drained on the worker thread, so the paging round-trips overlap
+    return list(iter_child_ous(org, parent))
 
-    org_chart = list()
-    data = pd.DataFrame(
-        columns=['parent_id', 'child_id', 'child_name', 'child_arn'])
-    circuit_breaker = False
-    parent = [root_id]
 
-    while not circuit_breaker:
+def get_parents(parents: List[str], rows: ColumnBuffer, max_workers: int = MAX_ORG_WORKERS):
+    """
+        fetches the child OUs of all given parents on a bounded worker pool.
+        results are collected in the order of `parents`, so the resulting table
+        is identical to a sequential walk.
+    """
+
+    org = get_client('organizations')
+    org_chart = dict()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        children = executor.map(partial(list_child_ous, org), parents)
+
+        for parent, ous in zip(parents, children):
+            collector = list()
+
+            if len(ous) != 0:  # only if children exist
+                for child in ous:
+                    ou_name = child['Name']
+                    ou_id = child['Id']
+                    ou_arn = child['Arn']
+
+                    package = {
+                        'parent_id': parent,
+                        'child_id': ou_id,
+                        'child_name': ou_name,
+                        'child_arn': ou_arn
+                    }
+                    rows.append(package)
+                    collector.append(ou_id)
+
+                org_chart[parent] = collector
+
+    return rows, org_chart
+
+
+def walk_ous(frontier: List[str], rows: ColumnBuffer, max_workers: int = MAX_ORG_WORKERS):
+    while len(frontier) != 0:
         """
-            1. for all parents get children
-            2. get children for parents with children
-            3. continue until all selected parents dont have any children
+            1. for all parents in the frontier get children concurrently
+            2. the children of this level become the next frontier
+            3. continue until no parent in the frontier has any children
         """
-        if parent == [root_id]:
-            package = {
-                'parent_id': root_id,
-                'child_id': root_id,
-                'child_name': "root",
-                'child_arn': np.nan
-            }
-            data = data.append(package, ignore_index=True)
-            data, new_children = get_parents(parents=parent, df=data)
-            parent = new_children
+        rows, org_chart = get_parents(
+            parents=frontier, rows=rows, max_workers=max_workers)
+        frontier = [child for children in org_chart.values()
+                    for child in children]
 
-        else:
-            keys = list(parent.keys())
-            col = list()
-            super_parent = parent
-            no_child_counter = 0
-            for key in keys:
-                data, parent = get_parents(super_parent[key], data)
-
-                if len(parent) == 0:
-                    no_child_counter += 1
+    return rows
 
-            if no_child_counter == len(keys):
-                circuit_breaker = True
 
-        if len(parent) != 0:
-            org_chart.append(parent)
+def org_output_path(name: str, output_format: str = ORG_OUTPUT_FORMAT) -> str:
     cwd = os.getcwd()
-    file_path = cwd+'/ou_chart.pkl'
-    data.to_pickle(file_path)
+    return cwd+'/'+name+OUTPUT_EXTENSIONS[output_format]
+
+
+def save_org_output(data: pd.DataFrame, name: str, output_format: str = ORG_OUTPUT_FORMAT) -> str:
+    file_path = org_output_path(name, output_format)
+
+    if output_format == 'arrow':
+        # uncompressed, so that readers can memory-map the columns
+        feather.write_feather(data, file_path, compression='uncompressed')
+    else:
+        data.to_pickle(file_path)
+
+    return file_path
+
+
+def load_org_chart(file_path: str, columns: List[str] = None, memory_map: bool = True) -> pd.DataFrame:
+    """
+        loads an org chart saved by traverse_ous or get_accounts_for_org_chart.
+        arrow files are memory-mapped and only the requested `columns` are
+        read. pickles are still supported but are always read in full.
+    """
+
+    if file_path.endswith(OUTPUT_EXTENSIONS['pickle']):
+        data = pd.read_pickle(file_path)
+        return data if columns is None else data[columns]
+
+    table = feather.read_table(
+        file_path, columns=columns, memory_map=memory_map)
+
+    return table.to_pandas()
+
+
+def save_ou_chart(data: pd.DataFrame, output_format: str = ORG_OUTPUT_FORMAT):
+    save_org_output(data, 'ou_chart', output_format)
+
+
+def traverse_ous(root_id: str, max_workers: int = MAX_ORG_WORKERS,
+                 output_format: str = ORG_OUTPUT_FORMAT):
+
+    rows = ColumnBuffer(columns=OU_COLUMNS)
+    package = {
+        'parent_id': root_id,
+        'child_id': root_id,
+        'child_name': "root",
+        'child_arn': np.nan
+    }
+    rows.append(package)
+    rows = walk_ous(frontier=[root_id], rows=rows, max_workers=max_workers)
+
+    data = rows.to_frame()
+    save_ou_chart(data, output_format)
 
     return data
 
 
 def get_root():
-    org = boto3.client('organizations')
+    org = get_client('organizations')
     try:
-        root = org.list_roots()['Roots']
+        root = list(iter_roots(org))
         root_id = None
 
         if len(root) > 1:
@@ -180,45 +256,279 @@ def get_root():
     return root_id
 
 
-def get_accounts_for_org_chart(org: pd.DataFrame):
-    org_client = boto3.client('organizations')
-    parents = list(org['child_id'].unique())
-    account_map = pd.DataFrame(
-        columns=['parent_id', 'account_id', 'account_arn', 'account_email', 'account_name'])
+def account_package(parent: str, account: dict) -> dict:
+    return {
+        'parent_id': parent,
+        'account_id': account['Id'],
+        'account_arn': account['Arn'],
+        'account_email': account['Email'],
+        'account_name': account['Name']
+    }
 
-    for parent in parents:
-        res = org_client.list_accounts_for_parent(ParentId=parent)['Accounts']
-        if len(res) != 0:
-            for account in res:
 
-                if account['Status'] == "ACTIVE":
-                    account_id = account['Id']
-                    account_arn = account['Arn']
-                    account_email = account['Email']
-                    account_name = account['Name']
+def get_parent_id(org, child_id: str) -> str:
+    return next(paginate(org, 'list_parents', 'Parents',
+                         ChildId=child_id))['Id']
 
-                    package = {
-                        'parent_id': parent,
-                        'account_id': account_id,
-                        'account_arn': account_arn,
-                        'account_email': account_email,
-                        'account_name': account_name
 
-                    }
+def map_accounts_per_parent(org_client, parents: List[str], account_map: ColumnBuffer):
+    for parent in parents:
+        for account in iter_accounts_for_parent(org_client, parent):
+
+            if account['Status'] == "ACTIVE":
+                account_map.append(account_package(parent, account))
+
+    return account_map
+
+
+def map_accounts_bulk(org_client, parents: List[str], account_map: ColumnBuffer,
+                      account_parents: dict, accounts: List[dict] = None,
+                      max_workers: int = MAX_ORG_WORKERS):
+    """
+        pulls all accounts with one paginated list_accounts sweep and attaches
+        them to their OUs. list_accounts does not return the parent, so it is
+        taken from `account_parents` and only looked up via list_parents for
+        accounts without a known parent, or whose known parent no longer exists.
+        known parents are trusted as they are, so they must be current (e.g.
+        those of a snapshot still within its TTL). if more parents are missing
+        than there are OUs, or none is known, the accounts are listed per OU
+        instead. an already fetched list of active `accounts` skips the sweep.
+    """
+
+    ou_ids = set(parents)
+    if accounts is None and len(account_parents) == 0:
+        # every parent would be missing, the sweep would be wasted
+        return map_accounts_per_parent(org_client, parents, account_map)
+    if accounts is None:
+        accounts = list_active_accounts(org_client)
+    missing = [account['Id'] for account in accounts
+               if account_parents.get(account['Id']) not in ou_ids]
+
+    if len(missing) > len(parents):
+        # one list_accounts_for_parent call per OU is cheaper than one
+        # list_parents call per account
+        logger.info(
+            f'{len(missing)} account(s) without a known parent, listing the accounts of {len(parents)} OU(s) instead')
+        return map_accounts_per_parent(org_client, parents, account_map)
+
+    if len(missing) != 0:
+        logger.info(f'looking up the parent of {len(missing)} account(s)')
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            found = executor.map(
+                partial(get_parent_id, org_client), missing)
+            account_parents = {**account_parents, **dict(zip(missing, found))}
+
+    for account in accounts:
+        account_map.append(account_package(
+            account_parents[account['Id']], account))
+
+    return account_map
+
+
+def map_accounts(org: pd.DataFrame, bulk: bool = False,
+                 account_parents: dict = None) -> pd.DataFrame:
+    """
+        maps the active accounts onto the traversed OUs.
+        by default list_accounts_for_parent is called for every OU; with `bulk`
+        the accounts are discovered by a single list_accounts sweep instead
+        and placed by the current `account_parents` or list_parents, see
+        map_accounts_bulk.
+    """
+
+    org_client = get_client('organizations')
+    parents = list(org['child_id'].unique())
+    account_map = ColumnBuffer(columns=ACCOUNT_COLUMNS)
+
+    if bulk:
+        account_map = map_accounts_bulk(
+            org_client, parents, account_map, account_parents or dict())
+    else:
+        account_map = map_accounts_per_parent(org_client, parents, account_map)
 
-                    account_map = account_map.append(
-                        package, ignore_index=True)
+    return account_map.to_frame()
 
+
+def merge_org_chart(org: pd.DataFrame, account_map: pd.DataFrame,
+                    output_format: str = ORG_OUTPUT_FORMAT) -> pd.DataFrame:
     total = pd.merge(org, account_map, how='left',
                      left_on='child_id', right_on='parent_id')
-    cwd = os.getcwd()
-    file_path = cwd+'/entire_org.pkl'
-    total.to_pickle(file_path)
+    file_path = save_org_output(total, 'entire_org', output_format)
     logger.info(
-        f'saved traversed org chart @ {file_path}. //[grey italic] use [bold]pandas[/bold] to open [/grey italic]', extra={"markup": True})
+        f'saved traversed org chart @ {file_path}. //[grey italic] use [bold]organization_check.load_org_chart[/bold] to open [/grey italic]', extra={"markup": True})
     return total
 
 
+def get_accounts_for_org_chart(org: pd.DataFrame, bulk: bool = False,
+                               account_parents: dict = None,
+                               output_format: str = ORG_OUTPUT_FORMAT):
+    account_map = map_accounts(
+        org=org, bulk=bulk, account_parents=account_parents)
+
+    return merge_org_chart(org=org, account_map=account_map, output_format=output_format)
+
+
+def descendants(ou_chart: pd.DataFrame, ou_ids: set) -> set:
+    children = ou_chart[ou_chart.child_id != ou_chart.parent_id].groupby(
+        'parent_id')['child_id'].apply(list).to_dict()
+    found = set()
+    frontier = list(ou_ids)
+
+    while len(frontier) != 0:
+        frontier = [child for parent in frontier
+                    for child in children.get(parent, [])]
+        found.update(frontier)
+
+    return found
+
+
+def refresh_org_snapshot(snapshot: dict, max_workers: int = MAX_ORG_WORKERS):
+    """
+        brings a cached org snapshot up to date and only re-walks the subtrees
+        that changed. the change signals are
+            1. the direct children of the root: added top-level OUs are walked,
+               removed ones are dropped with their subtree.
+            2. one paginated list_accounts sweep: accounts that are new or sit
+               in an unknown OU trigger a re-walk of the nearest known
+               ancestor OU; accounts that are gone are dropped.
+        moves and renames that do not show in these signals (e.g. an account
+        moved between two known OUs) are only picked up by a full traversal
+        once the snapshot expires.
+
+        :returns tuple: (ou_chart, account_map) DataFrames
+    """
+
+    org = get_client('organizations')
+    root_id = snapshot['root_id']
+    ou_chart = snapshot['ou_chart']
+    cached_accounts = snapshot['accounts']
+    known_ous = set(ou_chart['child_id'])
+
+    top_level = list(iter_child_ous(org, root_id))
+    top_level_ids = {ou['Id'] for ou in top_level}
+    cached_top_level = set(ou_chart[(ou_chart.parent_id == root_id) & (
+        ou_chart.child_id != root_id)]['child_id'])
+    added = [ou for ou in top_level if ou['Id'] not in cached_top_level]
+    removed = cached_top_level - top_level_ids
+    removed = removed | descendants(ou_chart, removed)
+
+    accounts = list_active_accounts(org)
+    account_parents = {account: parent for account, parent in zip(
+        cached_accounts['account_id'], cached_accounts['parent_id'])
+        if parent in known_ous and parent not in removed}
+    new_accounts = [account['Id'] for account in accounts
+                    if account['Id'] not in account_parents]
+
+    if len(new_accounts) != 0:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            found = executor.map(partial(get_parent_id, org), new_accounts)
+            account_parents.update(dict(zip(new_accounts, found)))
+
+    rewalk = set()
+    for account_id in new_accounts:
+        ancestor = account_parents[account_id]
+        if ancestor in known_ous:  # attached to an OU we already know
+            continue
+        while ancestor not in known_ous and ancestor not in top_level_ids:
+            ancestor = get_parent_id(org, ancestor)
+        if ancestor in known_ous and ancestor not in removed:
+            rewalk.add(ancestor)
+    rewalk = rewalk - descendants(ou_chart, rewalk)
+
+    stale = removed | descendants(ou_chart, rewalk)
+    logger.info(
+        f'org snapshot refresh: {len(added)} new and {len(cached_top_level & removed)} removed top-level OU(s), {len(new_accounts)} new account(s), re-walking {len(rewalk)} subtree(s)')
+
+    rows = ColumnBuffer(columns=OU_COLUMNS)
+    rows.extend(ou_chart[~ou_chart.child_id.isin(stale)].to_dict('records'))
+    for ou in added:
+        rows.append({
+            'parent_id': root_id,
+            'child_id': ou['Id'],
+            'child_name': ou['Name'],
+            'child_arn': ou['Arn']
+        })
+    rows = walk_ous(frontier=list(rewalk) + [ou['Id'] for ou in added],
+                    rows=rows, max_workers=max_workers)
+    ou_chart = rows.to_frame()
+
+    account_map = map_accounts_bulk(
+        org, list(ou_chart['child_id']), ColumnBuffer(columns=ACCOUNT_COLUMNS),
+        account_parents, accounts=accounts, max_workers=max_workers)
+
+    return ou_chart, account_map.to_frame()
+
+
+def snapshot_account_parents(snapshot: dict) -> tuple:
+    """
+        the account -> parent mapping of a cached snapshot younger than
+        SNAPSHOT_TTL, for the bulk account mode. accounts moved between two
+        OUs since the snapshot was taken keep their old parent, the same
+        trade-off as serving the snapshot itself.
+
+        :returns tuple: (account_parents, created); an empty mapping and None
+        without a usable snapshot
+    """
+
+    if snapshot is None or snapshot_age(snapshot) >= SNAPSHOT_TTL:
+        return dict(), None
+
+    accounts = snapshot['accounts']
+    return dict(zip(accounts['account_id'], accounts['parent_id'])), snapshot['created']
+
+
+def map_accounts_cached(root_id: str, ou_chart: pd.DataFrame, bulk: bool = False,
+                        snapshot: dict = None) -> pd.DataFrame:
+    """
+        maps the accounts onto a freshly traversed org and saves the result as
+        the new snapshot. in `bulk` mode the parents of the previous snapshot
+        are reused, and the new snapshot keeps its creation time, so reused
+        parents expire with it and are looked up again after SNAPSHOT_TTL.
+    """
+
+    created = None
+    if bulk:
+        account_parents, created = snapshot_account_parents(
+            load_snapshot(root_id) if snapshot is None else snapshot)
+        account_map = map_accounts(org=ou_chart, bulk=True, account_parents=account_parents)
+    else:
+        account_map = map_accounts(org=ou_chart)
+
+    save_snapshot(root_id, ou_chart, account_map, created=created)
+
+    return account_map
+
+
+def get_cached_org_chart(root_id: str, ttl: int = SNAPSHOT_TTL, incremental: bool = False,
+                         bulk: bool = False, output_format: str = ORG_OUTPUT_FORMAT):
+    """
+        serves the org chart from the local snapshot while it is younger than
+        `ttl` seconds. an expired snapshot is refreshed incrementally if
+        `incremental` is set, otherwise the org is traversed from scratch.
+    """
+
+    snapshot = load_snapshot(root_id)
+
+    if snapshot is not None and snapshot_age(snapshot) < ttl:
+        logger.info(
+            f'[info]using cached org snapshot from {snapshot_age(snapshot) / 60:.0f} minute(s) ago[/info]', extra={"markup": True})
+        ou_chart = snapshot['ou_chart']
+        account_map = snapshot['accounts']
+        save_ou_chart(ou_chart, output_format)
+
+    elif snapshot is not None and incremental:
+        ou_chart, account_map = refresh_org_snapshot(snapshot)
+        save_ou_chart(ou_chart, output_format)
+        save_snapshot(root_id, ou_chart, account_map)
+
+    else:
+        ou_chart = traverse_ous(
+            root_id=root_id, output_format=output_format)
+        account_map = map_accounts_cached(
+            root_id, ou_chart, bulk=bulk, snapshot=snapshot)
+
+    return merge_org_chart(org=ou_chart, account_map=account_map, output_format=output_format)
+
+
 def get_relevant_accounts(org_df: pd.DataFrame):
     filter_words = 'sandbox|prod|test|^qa$|root'
     org_clean = org_df[org_df.account_id.notnull()].copy()
@@ -259,14 +569,32 @@ def get_relevant_accounts(org_df: pd.DataFrame):
     return collector
 
 
-def run_org_check():
-    login_info = login()
+def run_org_check(bulk_accounts: bool = False, login_info: dict = None,
+                  cache_ttl: int = None, incremental: bool = False,
+                  output_format: str = ORG_OUTPUT_FORMAT):
+    if login_info is None:
+        login_info = login()
     account_id = login_info['account']
 
     if is_billing_account(account_id=account_id):
         root_id = get_root()
-        org_list = traverse_ous(root_id=root_id)
-        org_df = get_accounts_for_org_chart(org=org_list)
+        if cache_ttl is None and bulk_accounts:
+            # the bulk mode takes the account parents from the snapshot of a
+            # previous run and keeps it for the next one
+            org_list = traverse_ous(
+                root_id=root_id, output_format=output_format)
+            account_map = map_accounts_cached(root_id, org_list, bulk=True)
+            org_df = merge_org_chart(
+                org=org_list, account_map=account_map, output_format=output_format)
+        elif cache_ttl is None:
+            org_list = traverse_ous(
+                root_id=root_id, output_format=output_format)
+            org_df = get_accounts_for_org_chart(
+                org=org_list, output_format=output_format)
+        else:
+            org_df = get_cached_org_chart(
+                root_id=root_id, ttl=cache_ttl, incremental=incremental, bulk=bulk_accounts,
+                output_format=output_format)
         payload = get_relevant_accounts(org_df=org_df)
         return payload
         
@@ -0,0 +1,42 @@
+from typing import Iterator
+
+
+def paginate(client, operation: str, result_key: str, **kwargs) -> Iterator[dict]:
+    """
+        yields the items under `result_key` of every page of a paginated AWS
+        list call, following NextToken. pages are requested only as the
+        consumer iterates, so only one page is held in memory at a time.
+    """
+
+    paginator = client.get_paginator(operation)
+    for page in paginator.paginate(**kwargs):
+        for item in page[result_key]:
+            yield item
+
+
+def iter_pages(client, operation: str, **kwargs) -> Iterator[dict]:
+    """
+        yields the raw pages of a paginated AWS call, for calls that return
+        more than one list per page.
+    """
+
+    paginator = client.get_paginator(operation)
+    for page in paginator.paginate(**kwargs):
+        yield page
+
+
+def iter_token_pages(client, operation: str, token_key: str = 'NextToken', **kwargs) -> Iterator[dict]:
+    """
+        yields the raw pages of a call botocore has no paginator for, e.g. the
+        Cost Explorer calls, passing `token_key` of each page to the next
+        request until a page comes without it.
+    """
+
+    method = getattr(client, operation)
+    while True:
+        page = method(**kwargs)
+        yield page
+        token = page.get(token_key)
+        if not token:
+            return
+        kwargs[token_key] = token
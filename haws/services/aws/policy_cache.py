@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import threading
+from haws.main import logger
+from haws.services.runtime_helper import cache_dir
+
+# policy versions are immutable, so a cached (PolicyArn, VersionId) document
+# never goes stale; the cache is only bounded in size
+POLICY_CACHE_DIR = os.path.join(cache_dir, 'policies')
+MAX_CACHE_BYTES = 20 * 1024 * 1024
+
+
+def cache_path(policy_arn: str, version_id: str) -> str:
+    key = hashlib.sha256(
+        f'{policy_arn}\0{version_id}'.encode('utf-8')).hexdigest()
+    return os.path.join(POLICY_CACHE_DIR, key + '.json')
+
+
+def get_cached_document(policy_arn: str, version_id: str) -> dict:
+    """
+        :returns dict: the cached policy document, None on a cache miss.
+    """
+
+    file_path = cache_path(policy_arn, version_id)
+
+    try:
+        with open(file_path, 'r') as fh:
+            entry = json.load(fh)
+        # the modification time orders entries for eviction
+        os.utime(file_path)
+    except (OSError, ValueError):
+        return None
+
+    if entry.get('PolicyArn') != policy_arn or entry.get('VersionId') != version_id:
+        return None
+
+    return entry['Document']
+
+
+def put_cached_document(policy_arn: str, version_id: str, document: dict,
+                        max_bytes: int = MAX_CACHE_BYTES):
+    os.makedirs(POLICY_CACHE_DIR, exist_ok=True)
+    file_path = cache_path(policy_arn, version_id)
+    entry = {
+        'PolicyArn': policy_arn,
+        'VersionId': version_id,
+        'Document': document
+    }
+
+    tmp_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(entry, fh)
+    os.replace(tmp_path, file_path)
+
+    evict(max_bytes=max_bytes)
+
+
+def evict(max_bytes: int = MAX_CACHE_BYTES):
+    """
+        removes the least recently used entries until the cache fits into
+        `max_bytes`.
+    """
+
+    entries = list()
+    for entry in os.scandir(POLICY_CACHE_DIR):
+        if entry.name.endswith('.json'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, file_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        logger.debug(f'evicted cached policy document {file_path}')
+
+
+def get_policy_document(iam, policy_arn: str) -> dict:
+    """
+        fetches the default version of a policy. get_policy is the only call
+        on a cache hit; get_policy_version only runs for unseen versions.
+    """
+
+    version_id = iam.get_policy(PolicyArn=policy_arn)[
+        'Policy']['DefaultVersionId']
+
+    document = get_cached_document(policy_arn, version_id)
+    if document is None:
+        document = iam.get_policy_version(
+            PolicyArn=policy_arn,
+            VersionId=version_id)['PolicyVersion']['Document']
+        put_cached_document(policy_arn, version_id, document)
+
+    return document
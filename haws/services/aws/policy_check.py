@@ -1,4 +1,3 @@
-import boto3
 import botocore
 import re
 from rich.prompt import Confirm
@@ -6,15 +5,21 @@ import sys
 import os
 from os import path
 from haws.services.setup_helper import setup_cli
-from rich.console import Console
+from haws.services.report_sink import get_report
 from typing import List
 from haws.config.leanix_policies import leanix_policies
-from haws.main import logger, runtime
+from haws.main import logger
 from haws.services.aws.credential_check import login
+from haws.services.runtime_helper import get_runtime_path
+from haws.services.aws.client_pool import get_client
+from haws.services.aws.action_index import missing_actions
+from haws.services.aws.policy_cache import get_policy_document
+from haws.services.aws.iam_snapshot import IAMSnapshot
+from haws.services.aws.policy_requirements import RequirementsIndex, get_requirements_index
 from haws.exceptions.authentication import AccessDenied, UnauthenticatedUserCredentials, NoRuntimeSettings, InvalidUserCredentials
 
 
-def check_user_policies(username: str):
+def check_user_policies(username: str, snapshot: IAMSnapshot = None):
     """
         gets all AWS policies attached to a user, fetched by his/her AWS username,
         and checks whether the LeanIX CI Policies were created.
@@ -22,7 +27,10 @@ def check_user_policies(username: str):
 
     """
 
-    iam = boto3.client('iam')
+    if snapshot is not None:
+        return snapshot.user_policies(username)
+
+    iam = get_client('iam')
     pattern = re.compile(
         'LeanIXCloudScanAdvisorPolicyReader|LeanIXCloudScanBillingPolicyReader|arn:aws:iam::aws:policy/ReadOnlyAccess')
     policies = iam.list_attached_user_policies(UserName=username)
@@ -35,8 +43,11 @@ def check_user_policies(username: str):
     return user_policies
 
 
-def check_user_group_policies(username: str):
-    iam = boto3.client('iam')
+def check_user_group_policies(username: str, snapshot: IAMSnapshot = None):
+    if snapshot is not None:
+        return snapshot.group_policies(username)
+
+    iam = get_client('iam')
     user_groups_list = iam.list_groups_for_user(UserName=username)['Groups']
 
     all_attached_groups = list()
@@ -54,9 +65,10 @@ def check_user_group_policies(username: str):
     return group_policies
 
 
-def get_all_user_policies(username: str):
-    user_policies = check_user_policies(username=username)
-    group_assigned_policies = check_user_group_policies(username=username)
+def get_all_user_policies(username: str, snapshot: IAMSnapshot = None):
+    user_policies = check_user_policies(username=username, snapshot=snapshot)
+    group_assigned_policies = check_user_group_policies(
+        username=username, snapshot=snapshot)
 
     if len(user_policies) == 0:
         logger.info(
@@ -83,14 +95,15 @@ def get_all_user_policies(username: str):
     return all_user_policies
 
 
-def authenticated_scan_policies(username: str):
+def authenticated_scan_policies(username: str, snapshot: IAMSnapshot = None):
     """
         gets all AWS policies attached to a user, fetched by his/her AWS username, and checks whether the LeanIX CI Policies
         were created and authenticates / verifies the credentials, if it fails to query the IAM console.
     """
 
     try:
-        user_policies = get_all_user_policies(username=username)
+        user_policies = get_all_user_policies(
+            username=username, snapshot=snapshot)
     except botocore.exceptions.NoCredentialsError:
         logger.error(
             '[danger]User not authenticated.[/danger]', extra={"markup": True})
@@ -100,21 +113,44 @@ def authenticated_scan_policies(username: str):
     return user_policies
 
 
-def compare_with_leanix(policies: dict):
+def authenticated_snapshot() -> IAMSnapshot:
+    try:
+        return IAMSnapshot.fetch()
+    except botocore.exceptions.NoCredentialsError:
+        logger.error(
+            '[danger]User not authenticated.[/danger]', extra={"markup": True})
+        raise UnauthenticatedUserCredentials("User is not authenticated")
+
+
+def get_index(policies: dict = leanix_policies) -> RequirementsIndex:
+    if policies is leanix_policies:
+        return get_requirements_index()
+
+    return RequirementsIndex(policies)
+
+
+def compare_with_leanix(policies: dict, leanix_policies: dict = leanix_policies):
     """
         compares specified policy permssions with LeanIX's prescribed policy permission set under
-        requirements.py
+        requirements.py. a policy passes if it grants every required action, wildcards included;
+        the actions it lacks are listed under `missing_actions`.
     """
 
+    index = get_index(leanix_policies)
     output = dict()
     for policy, data in policies.items():
 
         if data['exists']:
-            permission_check = data['req_permissions'].items(
-            ) == data['aws_permission'].items()
+            requirement = index.by_name.get(data.get('requirement'))
+            if requirement is not None:
+                missing = requirement.missing_actions(data['aws_permission'])
+            else:
+                missing = missing_actions(
+                    required=data['req_permissions'], attached=data['aws_permission'])
             output[policy] = {
                 'exists': data['exists'],
-                'permission_check': permission_check,
+                'permission_check': len(missing) == 0,
+                'missing_actions': missing,
                 'aws_permission': data['aws_permission'],
                 'req_permission': data['req_permissions'],
                 'mandatory': data['mandatory']
@@ -142,25 +178,28 @@ def compare_with_leanix(policies: dict):
     return output
 
 
-def get_policy_permissions(policies: dict):
+def get_policy_permissions(policies: dict, snapshot: IAMSnapshot = None, iam=None):
     """
         retrieves the permissions set for a list of policies.
+        documents found in the IAM `snapshot` are not fetched again.
     """
 
-    iam = boto3.client('iam')
+    if iam is None:
+        iam = get_client('iam')
     policy_container = dict()
     for policy, data in policies.items():
         if data['exists']:
-            policy_version = iam.get_policy(PolicyArn=policy)[
-                'Policy']['DefaultVersionId']
-            permission = iam.get_policy_version(
-                PolicyArn=policy,
-                VersionId=policy_version)['PolicyVersion']['Document']
+            permission = None
+            if snapshot is not None:
+                permission = snapshot.policy_document(policy)
+            if permission is None:
+                permission = get_policy_document(iam, policy)
 
             policy_container[policy] = {
                 'aws_permission': permission,
                 'exists': data['exists'],
                 'req_permissions': data['req_permissions'],
+                'requirement': data.get('requirement'),
                 'mandatory': data['mandatory']
             }
         else:
@@ -180,43 +219,33 @@ def filter_policies(policies: List[str], leanix_policies: dict = leanix_policies
         see https://dev.leanix.net/docs/cloud-intelligence
     """
 
-    regex_collector = dict()
+    index = get_index(leanix_policies)
     filtered_policies = dict()
-    unmatched_policies = list(leanix_policies.keys())
-
-    for policy_name, permissions in leanix_policies.items():
-        string_match = re.compile(policy_name)
-        regex_collector[policy_name] = {
-            'regex': string_match, 'permissions': permissions}
+    unmatched_policies = dict.fromkeys(index.by_name)
 
     for policy in policies:
+        requirement = index.match(policy)
 
-        count = 0
-        for policy_arn, data in regex_collector.items():
-            if re.search(data['regex'], policy):
-                count += 1
-                filtered_policies[policy] = {
-                    'exists': True,
-                    'req_permissions': data['permissions'],
-                    'mandatory': True
-                }
-                unmatched_policies.remove(policy)
-        if count == 0:
+        if requirement is not None:
+            filtered_policies[policy] = {
+                'exists': True,
+                'req_permissions': requirement.document,
+                'requirement': requirement.name,
+                'mandatory': True
+            }
+            unmatched_policies.pop(requirement.name, None)
+        else:
             filtered_policies[policy] = {
                 'exists': False, 'req_permissions': None, 'mandatory': False}
 
-    if len(unmatched_policies) != 0:
-        for missing_policy in unmatched_policies:
-            filtered_policies[missing_policy] = {
-                'exists': False, 'req_permissions': None, 'mandatory': True}
-
-    # with open('permission.json', 'w', encoding='utf-8') as fh:
-    #     json.dump(filtered_policies, fh, indent=4)
+    for missing_policy in unmatched_policies:
+        filtered_policies[missing_policy] = {
+            'exists': False, 'req_permissions': None, 'mandatory': True}
 
     return filtered_policies
 
 
-def verify_permissions(policies: List[str]) -> dict:
+def verify_permissions(policies: List[str], snapshot: IAMSnapshot = None) -> dict:
     """
         processes a set of policies and checks their containing permissions against the required LeanIX permissions stipulated
         under leanix_policies.py.
@@ -234,7 +263,7 @@ def verify_permissions(policies: List[str]) -> dict:
     """
 
     filtered_policies = filter_policies(policies=policies)
-    permissions = get_policy_permissions(filtered_policies)
+    permissions = get_policy_permissions(filtered_policies, snapshot=snapshot)
     validated_permissions = compare_with_leanix(permissions)
 
     return validated_permissions
@@ -242,86 +271,124 @@ def verify_permissions(policies: List[str]) -> dict:
 
 def create_policy_report(policy_checks: dict):
     num_healthchecks = 0
-    cwd = os.getcwd()
-    filename = cwd+'/report.txt'
     failed_checks = 0
     passed_checks = 0
+    report = get_report()
 
-    with open(filename, 'w') as fh:
-        console = Console(file=fh, width=75)
-        console.rule("Policy Checks")
-
+    with report.section('policy', 'Policy Checks') as section:
         for policy, data in policy_checks.items():
+            details = {'missing_actions': data.get('missing_actions') or []}
             if (data['exists'] and data['permission_check']
                     and data['mandatory']):
-                console.print(
-                    f':white_check_mark: {policy} is set up correctly')
+                section.write(policy, 'passed',
+                              f'{policy} is set up correctly')
                 passed_checks += 1
                 num_healthchecks += 1
             elif (data['exists'] and not data['permission_check']
                   and data['mandatory']):
                 failed_checks += 1
                 num_healthchecks += 1
-                console.print(
-                    f':stop_sign: {policy} does not comply with the naming convention or the wrong policy(-ies) was attached')
+                section.write(policy, 'failed',
+                              f'{policy} does not comply with the naming convention or the wrong policy(-ies) was attached', details)
             elif (not data['exists'] and not data['permission_check'] and
                   not data['mandatory']):
-                console.print(
-                    f':information_source: {policy} was found but is not mandatory for the LeanIX Scan Agent')
+                section.write(policy, 'info',
+                              f'{policy} was found but is not mandatory for the LeanIX Scan Agent')
             elif (not data['exists'] and data['mandatory']):
                 failed_checks += 1
                 num_healthchecks += 1
-                console.print(
-                    f':stop_sign: {policy} is not attached to the user, but is mandatory')
-        console.rule()
-
-        logger.info('[bold]AWS Policy Checks[/bold]', extra={"markup": True})
-        if passed_checks == num_healthchecks:
-            console.print(
-                f'[bold]:white_check_mark: {passed_checks}/{num_healthchecks} checks passed[/bold]')
+                section.write(policy, 'failed',
+                              f'{policy} is not attached to the user, but is mandatory')
+
+        section.summary = {'passed': passed_checks,
+                           'failed': failed_checks, 'total': num_healthchecks}
+
+    logger.info('[bold]AWS Policy Checks[/bold]', extra={"markup": True})
+    if passed_checks == num_healthchecks:
+        logger.info(
+            f'[bold]:white_check_mark: {passed_checks}/{num_healthchecks} checks passed[/bold]', extra={"markup": True})
+    else:
+        if passed_checks != 0:
             logger.info(
                 f'[bold]:white_check_mark: {passed_checks}/{num_healthchecks} checks passed[/bold]', extra={"markup": True})
-        else:
-            if passed_checks != 0:
-                logger.info(
-                    f'[bold]:white_check_mark: {passed_checks}/{num_healthchecks} checks passed[/bold]', extra={"markup": True})
-            logger.warning(
-                f'[bold red]:stop_sign: {failed_checks}/{num_healthchecks} checks failed[/bold red]. please see the details: [bold]{filename}[/bold]',
-                extra={"markup": True})
-            console.log(
-                f'[bold red]:stop_sign: {failed_checks}/{num_healthchecks} checks failed[/bold red].')
+        logger.warning(
+            f'[bold red]:stop_sign: {failed_checks}/{num_healthchecks} checks failed[/bold red]. please see the details: [bold]{", ".join(report.paths.values())}[/bold]',
+            extra={"markup": True})
+
+    return {
+        'passed_checks': passed_checks,
+        'failed_checks': failed_checks,
+        'num_healthchecks': num_healthchecks
+    }
 
 
-def run_policy_check(save_runtime: bool):
+def check_policies(login_info: dict, iam_snapshot: bool = False):
+    """
+        with `iam_snapshot` all IAM data is taken from one
+        get_account_authorization_details sweep instead of per-entity calls.
+    """
+
+    if login_info['check']:
+        snapshot = authenticated_snapshot() if iam_snapshot else None
+        user_policies = authenticated_scan_policies(
+            username=login_info['username'], snapshot=snapshot)
+        policy_checks = verify_permissions(
+            policies=user_policies, snapshot=snapshot)
+
+    return create_policy_report(policy_checks=policy_checks)
+
+
+def prompt_setup(save_runtime: bool) -> dict:
+    """
+        offers to run the setup after a failed login and logs in again.
+        shuts down if the user declines.
+    """
+
+    rerun = Confirm.ask("Do you want to setup the healthchecker? [y/n]")
+    if rerun:
+        setup_cli()
+        return login()
+    else:
+        if not save_runtime:
+            runtime = get_runtime_path()
+            if path.exists(runtime):
+                os.remove(runtime)
+                logger.info("[info]removed runtime.json [/info]",
+                            extra={"markup": True})
+        logger.info("[info]shutting down[/info]", extra={"markup": True})
+        sys.exit()
+
+
+def ensure_login(save_runtime: bool) -> dict:
     try:
-        login_info = login()
-        if login_info['check']:
-            user_policies = authenticated_scan_policies(
-                username=login_info['username'])
-            policy_checks = verify_permissions(policies=user_policies)
+        return login()
 
-        create_policy_report(policy_checks=policy_checks)
+    except AccessDenied:
+        sys.exit()
+
+    except (UnauthenticatedUserCredentials, NoRuntimeSettings,
+            InvalidUserCredentials):
+        return prompt_setup(save_runtime=save_runtime)
+
+
+def run_policy_check(save_runtime: bool, login_info: dict = None, iam_snapshot: bool = False):
+    """
+        with the `login_info` of ensure_login, e.g. resolved on the main
+        thread before the phases of haws run start, failures are raised
+        instead of prompting for the setup.
+    """
+
+    if login_info is not None:
+        return check_policies(login_info=login_info, iam_snapshot=iam_snapshot)
+
+    login_info = ensure_login(save_runtime=save_runtime)
+    try:
+        return check_policies(login_info=login_info, iam_snapshot=iam_snapshot)
 
     except AccessDenied:
         sys.exit()
 
     except (UnauthenticatedUserCredentials, NoRuntimeSettings,
             InvalidUserCredentials):
-        rerun = Confirm.ask("Do you want to setup the healthchecker? [y/n]")
-        if rerun:
-            setup_cli()
-            login_info = login()
-            if login_info['check']:
-                user_policies = authenticated_scan_policies(
-                    username=login_info['username'])
-                policy_checks = verify_permissions(policies=user_policies)
-
-            create_policy_report(policy_checks=policy_checks)
-        else:
-            if not save_runtime:
-                if path.exists(runtime):
-                    os.remove(runtime)
-                    logger.info("[info]removed runtime.json [/info]",
-                                extra={"markup": True})
-            logger.info("[info]shutting down[/info]", extra={"markup": True})
-            sys.exit()
+        login_info = prompt_setup(save_runtime=save_runtime)
+        return check_policies(login_info=login_info, iam_snapshot=iam_snapshot)
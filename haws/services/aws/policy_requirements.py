@@ -0,0 +1,91 @@
+import hashlib
+import json
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import List, NamedTuple, Pattern, Tuple, Union
+from haws.config.leanix_policies import leanix_policies
+from haws.services.aws.action_index import ActionIndex, allowed_actions
+
+
+def document_digest(document: Union[dict, str]) -> str:
+    """
+        hash of the canonical JSON form of a policy document, so documents
+        that only differ in key order or whitespace hash the same.
+    """
+
+    if isinstance(document, str):
+        document = json.loads(document)
+    canonical = json.dumps(document, sort_keys=True, separators=(',', ':'))
+
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class PolicyRequirement(NamedTuple):
+    name: str
+    pattern: Pattern
+    document: dict
+    digest: str
+    actions: Tuple[str, ...]
+    action_set: frozenset
+
+    def missing_actions(self, attached: Union[dict, str]) -> List[str]:
+        if document_digest(attached) == self.digest:
+            return []
+
+        return ActionIndex.from_document(attached).missing(self.actions)
+
+
+class RequirementsIndex:
+    """
+        the LeanIX policy requirements compiled for lookups: required policies
+        by name and exact ARN, one combined pattern for name matches and, per
+        policy, the canonical digest and the required actions.
+    """
+
+    def __init__(self, policies: dict):
+        requirements = list()
+        for name, document in policies.items():
+            actions = tuple(dict.fromkeys(allowed_actions(document)))
+            requirements.append(PolicyRequirement(
+                name=name,
+                pattern=re.compile(name),
+                document=document,
+                digest=document_digest(document),
+                actions=actions,
+                action_set=frozenset(action.lower() for action in actions)
+            ))
+
+        self.requirements = tuple(requirements)
+        self.by_name = MappingProxyType(
+            {requirement.name: requirement for requirement in requirements})
+        self.by_arn = MappingProxyType(
+            {requirement.name: requirement for requirement in requirements if requirement.name.startswith('arn:')})
+        self.combined = re.compile('|'.join(
+            f'(?P<r{position}>{requirement.name})' for position, requirement in enumerate(requirements)))
+
+    def match(self, policy_arn: str) -> PolicyRequirement:
+        """
+            :returns PolicyRequirement: the requirement an attached policy
+            satisfies by name, None if it is not a LeanIX policy.
+        """
+
+        requirement = self.by_arn.get(policy_arn)
+        if requirement is not None:
+            return requirement
+
+        found = self.combined.search(policy_arn)
+        if found is None:
+            return None
+
+        return self.requirements[int(found.lastgroup[1:])]
+
+
+@lru_cache(maxsize=None)
+def get_requirements_index() -> RequirementsIndex:
+    """
+        the index of haws.config.leanix_policies, built on first use and
+        shared for the rest of the process.
+    """
+
+    return RequirementsIndex(leanix_policies)
@@ -0,0 +1,259 @@
+import functools
+import os
+import threading
+import time
+import pandas as pd
+from haws.main import logger
+
+# starting requests per second for each service, keyed by the botocore
+# service id. Organizations and Cost Explorer allow only a few TPS per
+# account, IAM and STS somewhat more. the rates are probed upwards until AWS
+# throttles, up to MAX_RATE_FACTOR times the starting rate and never beyond
+# MAX_RATE. both can be overridden with `haws --api-rate SERVICE=RATE` and
+# `haws --max-api-rate`, which set the environment below.
+DEFAULT_RATES = {
+    'organizations': 4.0,
+    'cost-explorer': 4.0,
+    'iam': 10.0,
+    'sts': 20.0
+}
+DEFAULT_RATE = 10.0
+MIN_RATE = 0.5
+MAX_RATE = 100.0
+MAX_RATE_FACTOR = 4.0
+RATES_ENV = 'HAWS_API_RATES'
+MAX_RATE_ENV = 'HAWS_MAX_API_RATE'
+# multiplicative decrease on a throttle, additive increase of RECOVERY
+# requests per second for every second of successful calls, so the rate
+# grows with time and not with the number of concurrent callers.
+# throttles of requests that were already in flight when the rate was
+# lowered do not lower it again within BACKOFF_WINDOW seconds.
+BACKOFF = 0.5
+BACKOFF_WINDOW = 1.0
+RECOVERY = 0.5
+
+THROTTLE_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'TooManyRequestsException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'RequestLimitExceeded',
+    'SlowDown'
+}
+
+
+class TokenBucket:
+    """
+        token bucket for one service and operation. callers reserve a token
+        and sleep until it is due, so waiting never holds the lock. the rate
+        halves on every throttle and creeps up towards `max_rate` while calls
+        succeed, past the starting rate until AWS throttles again.
+    """
+
+    def __init__(self, rate: float, max_rate: float = MAX_RATE):
+        self.max_rate = max_rate
+        self.rate = min(rate, max_rate)
+        self.tokens = max(self.rate, 1.0)
+        self.updated = time.monotonic()
+        self.backed_off = 0.0
+        self.recovered = self.updated
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.throttles = 0
+        self.waited = 0.0
+
+    def acquire(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(max(self.rate, 1.0), self.tokens +
+                              (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.calls += 1
+            self.waited += wait
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+    def throttled(self):
+        with self.lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self.backed_off > BACKOFF_WINDOW:
+                self.backed_off = now
+                self.rate = max(MIN_RATE, self.rate * BACKOFF)
+                self.tokens = min(self.tokens, 0.0)
+                self.recovered = now
+
+    def succeeded(self):
+        with self.lock:
+            now = time.monotonic()
+            # idle time between calls does not count as successful traffic
+            elapsed = min(now - self.recovered, 1.0)
+            self.recovered = now
+            self.rate = min(self.max_rate, self.rate + RECOVERY * elapsed)
+
+
+def parse_rates(value: str) -> dict:
+    """
+        parses `SERVICE=RATE[,SERVICE=RATE...]`, e.g. `organizations=2,iam=5`.
+    """
+
+    rates = dict()
+    for item in filter(None, (value or '').split(',')):
+        service, _, rate = item.partition('=')
+        rate = float(rate)
+        if not service or rate <= 0:
+            raise ValueError(f'invalid API rate {item!r}, expected SERVICE=RATE')
+        rates[service.strip()] = max(MIN_RATE, rate)
+
+    return rates
+
+
+_lock = threading.Lock()
+_buckets = dict()
+# statistics of released buckets per (service, operation):
+# [calls, throttles, waited, lowest rate]
+_released = dict()
+_rates = None
+_max_rate = None
+
+
+def load_rates(rates: dict = None, max_rate: float = None):
+    global _rates, _max_rate
+
+    _rates = dict(DEFAULT_RATES)
+    _rates.update(parse_rates(os.getenv(RATES_ENV)) if rates is None else rates)
+    _max_rate = max(MIN_RATE, float(os.getenv(MAX_RATE_ENV, MAX_RATE)) if max_rate is None else max_rate)
+
+
+def configure(rates: dict = None, max_rate: float = None):
+    """
+        sets the starting rate per service and the rate no bucket probes
+        beyond. without arguments they are read from the environment again.
+        existing buckets are dropped.
+    """
+
+    with _lock:
+        load_rates(rates, max_rate)
+        _buckets.clear()
+        _released.clear()
+
+
+def reset():
+    """
+        drops all buckets and their statistics and re-reads the configured
+        rates, e.g. before a batch worker checks the next profile.
+    """
+
+    configure()
+
+
+def get_bucket(credential: str, service: str, operation: str) -> TokenBucket:
+    # API limits apply per account, so every set of credentials has its own
+    # buckets
+    key = (credential, service, operation)
+
+    with _lock:
+        if _rates is None:
+            load_rates()
+        bucket = _buckets.get(key)
+        if bucket is None:
+            rate = _rates.get(service, DEFAULT_RATE)
+            bucket = TokenBucket(rate, min(_max_rate, rate * MAX_RATE_FACTOR))
+            _buckets[key] = bucket
+
+    return bucket
+
+
+def release(credential: str):
+    """
+        drops the buckets of credentials that are no longer used, e.g. those
+        of an assumed member role, and keeps their statistics.
+    """
+
+    with _lock:
+        for key in [key for key in _buckets if key[0] == credential]:
+            bucket = _buckets.pop(key)
+            stats = _released.setdefault(key[1:], [0, 0, 0.0, bucket.rate])
+            stats[0] += bucket.calls
+            stats[1] += bucket.throttles
+            stats[2] += bucket.waited
+            stats[3] = min(stats[3], bucket.rate)
+
+
+def split_event_name(event_name: str):
+    # e.g. before-send.organizations.ListAccounts
+    _, service, operation = event_name.split('.', 2)
+    return service, operation
+
+
+def before_send(event_name: str, credential: str = None, **kwargs):
+    get_bucket(credential, *split_event_name(event_name)).acquire()
+
+
+def needs_retry(event_name: str, credential: str = None, response=None, **kwargs):
+    if response is None:
+        return
+
+    bucket = get_bucket(credential, *split_event_name(event_name))
+    http_response, parsed = response
+    if parsed.get('Error', {}).get('Code') in THROTTLE_CODES:
+        bucket.throttled()
+    elif http_response.status_code < 400:
+        bucket.succeeded()
+
+
+def register_limiter(client, credential: str = None):
+    """
+        routes every request of a client through the buckets of its
+        credentials (e.g. the access key id), including botocore's retry
+        attempts.
+    """
+
+    client.meta.events.register('before-send', functools.partial(before_send, credential=credential))
+    client.meta.events.register('needs-retry', functools.partial(needs_retry, credential=credential))
+
+
+def limiter_stats() -> pd.DataFrame:
+    with _lock:
+        buckets = dict(_buckets)
+        released = {key: list(stats) for key, stats in _released.items()}
+
+    rows = [(service, operation, bucket.calls, bucket.throttles, bucket.waited, bucket.rate)
+            for (_, service, operation), bucket in buckets.items()]
+    rows += [(service, operation, *stats) for (service, operation), stats in released.items()]
+    stats = pd.DataFrame(rows, columns=['service', 'operation', 'calls', 'throttles', 'waited', 'rate'])
+
+    # the credentials are not saved; the rate is the lowest of all accounts
+    return stats.groupby(['service', 'operation'], as_index=False).agg(
+        {'calls': 'sum', 'throttles': 'sum', 'waited': 'sum', 'rate': 'min'})
+
+
+def save_limiter_stats() -> pd.DataFrame:
+    """
+        logs the per-operation call counts, throttles and waiting time and
+        saves them to api_calls.csv, to tune concurrency from real runs.
+    """
+
+    stats = limiter_stats()
+    if len(stats) == 0:
+        return stats
+
+    cwd = os.getcwd()
+    file_path = cwd+'/api_calls.csv'
+    stats.to_csv(file_path, index=False)
+
+    logger.info(
+        f'[info]{stats["calls"].sum()} AWS call(s), {stats["throttles"].sum()} throttled, {stats["waited"].sum():.2f}s spent waiting on rate limits[/info]', extra={"markup": True})
+    for _, row in stats[stats['throttles'] > 0].iterrows():
+        logger.warning(
+            f'{row["service"]}.{row["operation"]} throttled {row["throttles"]} time(s), rate now {row["rate"]:.1f}/s')
+    logger.info(f'saved API call statistics @ {file_path}')
+
+    return stats
@@ -0,0 +1,141 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+from haws.main import logger
+from haws.services.frame_helper import ColumnBuffer
+from haws.services.report_sink import get_report
+from haws.services.aws.client_pool import get_client
+from haws.services.aws.identity_cache import caller_identity
+from haws.services.aws.pagination import iter_token_pages
+from haws.services.aws.cost_allocation_tags import TAG_CACHE_TTL, cost_window, load_cached_tags, save_cached_tags
+
+# Cost Explorer allows a few requests per second per account and bills each
+# one; the rate limiter paces the workers, more would only queue up
+MAX_TAG_WORKERS = 4
+COST_METRIC = 'UnblendedCost'
+SPEND_COLUMNS = ['tag', 'value', 'amount']
+COVERAGE_COLUMNS = ['tag', 'values', 'total_spend', 'tagged_spend',
+                    'untagged_spend', 'coverage']
+
+
+def iter_tag_spend(ce, tag: str, time_period: dict) -> Iterator[tuple]:
+    """
+        yields (value, amount) per tag value and month of one GetCostAndUsage
+        query grouped by the tag. untagged spend has the empty value.
+    """
+
+    pages = iter_token_pages(ce, 'get_cost_and_usage', token_key='NextPageToken',
+                             TimePeriod=time_period, Granularity='MONTHLY', Metrics=[COST_METRIC],
+                             GroupBy=[{'Type': 'TAG', 'Key': tag}])
+    prefix = len(tag) + 1
+    for page in pages:
+        for result in page['ResultsByTime']:
+            for group in result['Groups']:
+                # group keys come as '<tag>$<value>'
+                yield group['Keys'][0][prefix:], group['Metrics'][COST_METRIC]['Amount']
+
+
+def tag_spend(tags: List[str], months: int = 6, max_workers: int = MAX_TAG_WORKERS) -> pd.DataFrame:
+    """
+        :returns pd.DataFrame: one row per tag, value and month with the spend
+    """
+
+    ce = get_client('ce')
+    time_period = cost_window(months)
+    rows = ColumnBuffer(SPEND_COLUMNS)
+
+    def fetch(tag: str) -> list:
+        return list(iter_tag_spend(ce, tag, time_period))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for tag, groups in zip(tags, executor.map(fetch, tags)):
+            for value, amount in groups:
+                rows.append({'tag': tag, 'value': value, 'amount': amount})
+
+    spend = rows.to_frame()
+    spend['amount'] = pd.to_numeric(spend['amount'], errors='coerce').fillna(0.0).astype(float)
+    return spend
+
+
+def cached_tag_spend(tags: List[str], ttl: int = TAG_CACHE_TTL, months: int = 6) -> pd.DataFrame:
+    """
+        tag_spend, cached per account like the tag discovery for `ttl`
+        seconds; `ttl` 0 disables the cache. the coverage and the tag profile
+        share the result, so every tag is queried once.
+    """
+
+    if not tags:
+        return tag_spend(tags, months=months)
+
+    account_id = caller_identity()['Account']
+    cached = load_cached_tags(account_id, ttl, kind='tag_spend')
+    if cached is not None and cached['months'] == months and set(tags) <= set(cached['tags']):
+        logger.info('using tag spend cached by a previous run')
+        spend = pd.DataFrame(cached['spend'], columns=SPEND_COLUMNS).astype({'amount': float})
+        return spend[spend['tag'].isin(tags)].reset_index(drop=True)
+
+    spend = tag_spend(tags, months=months)
+    save_cached_tags(account_id, {'tags': list(tags), 'months': months,
+                                  'spend': spend.to_dict(orient='list')}, kind='tag_spend')
+
+    return spend
+
+
+def spend_coverage(spend: pd.DataFrame) -> pd.DataFrame:
+    """
+        aggregates the spend per tag: the share of the total that carries a
+        value of the tag, and the untagged remainder.
+    """
+
+    untagged = spend['value'].to_numpy() == ''
+    spend = spend.assign(
+        untagged_spend=np.where(untagged, spend['amount'].to_numpy(), 0.0),
+        tagged_value=spend['value'].where(~untagged))
+
+    coverage = spend.groupby('tag', sort=False).agg(
+        values=('tagged_value', 'nunique'),
+        total_spend=('amount', 'sum'),
+        untagged_spend=('untagged_spend', 'sum'))
+    coverage['tagged_spend'] = coverage['total_spend'] - coverage['untagged_spend']
+    total = coverage['total_spend'].to_numpy()
+    coverage['coverage'] = np.divide(
+        coverage['tagged_spend'].to_numpy() * 100, total,
+        out=np.zeros(len(total)), where=total > 0).round(2)
+
+    return coverage.reset_index()[COVERAGE_COLUMNS].sort_values(
+        'coverage', ascending=False, ignore_index=True)
+
+
+def create_coverage_report(coverage: pd.DataFrame):
+    with get_report().section('tag_coverage', 'Cost Allocation Tag Coverage') as section:
+        for row in coverage.itertuples(index=False):
+            section.write(row.tag, 'info',
+                          f'{row.tag}: {row.coverage:.2f}% of {row.total_spend:,.2f} covered, '
+                          f'{row.untagged_spend:,.2f} untagged, {row.values} values',
+                          {'values': int(row.values), 'total_spend': float(row.total_spend),
+                           'untagged_spend': float(row.untagged_spend), 'coverage': float(row.coverage)})
+
+
+def run_tag_coverage(tags: List[str], months: int = 6, spend: pd.DataFrame = None) -> pd.DataFrame:
+    """
+        :param spend: the result of `tag_spend`, if it was already queried
+    """
+
+    if not tags:
+        logger.warning('no active cost allocation tags, skipping the coverage analysis')
+        return None
+
+    if spend is None:
+        spend = cached_tag_spend(tags, months=months)
+    coverage = spend_coverage(spend)
+
+    cwd = os.getcwd()
+    file_path = cwd+'/tag_coverage.csv'
+    coverage.to_csv(file_path, index=False)
+    create_coverage_report(coverage)
+
+    logger.info(f'saved cost allocation tag coverage @ {file_path}')
+
+    return coverage
@@ -0,0 +1,77 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import List
+from haws.main import logger
+from haws.services.aws.cost_allocation_tags import TAG_CACHE_TTL
+from haws.services.aws.tag_coverage import cached_tag_spend, spend_coverage
+
+TOP_VALUES = 5
+# tags with more values than this slow down the LeanIX cost import
+HIGH_CARDINALITY = 1000
+PROFILE_COLUMNS = ['tag', 'cardinality', 'empty_value_share',
+                   'high_cardinality', 'top_values']
+
+
+def profile_values(tags: List[str], spend: pd.DataFrame, top: int = TOP_VALUES) -> pd.DataFrame:
+    """
+        profiles the values of every tag from its spend per value: the
+        number of values, the percentage of spend without a value and the
+        `top` values with the most spend. tags without spend have no share.
+
+        :param spend: the result of `tag_coverage.tag_spend`
+        :returns pd.DataFrame: one row per tag, highest cardinality first
+    """
+
+    tags = list(tags)
+    coverage = spend_coverage(spend).set_index('tag').reindex(tags)
+    total = coverage['total_spend'].to_numpy(dtype=float)
+    untagged = coverage['untagged_spend'].to_numpy(dtype=float)
+    cardinality = coverage['values'].fillna(0).to_numpy(dtype=np.int64)
+
+    ranked = spend[spend['value'] != ''].groupby(['tag', 'value'], sort=False)['amount'].sum()
+    ranked = ranked.sort_values(ascending=False).groupby(level='tag', sort=False).head(top)
+    by_spend = ranked.reset_index().groupby('tag', sort=False)['value'].agg(list).to_dict()
+
+    profile = pd.DataFrame({
+        'tag': tags,
+        'cardinality': cardinality,
+        'empty_value_share': np.divide(untagged * 100, total, out=np.full(len(tags), np.nan),
+                                       where=total > 0).round(2),
+        'high_cardinality': cardinality > HIGH_CARDINALITY,
+        'top_values': ['; '.join(by_spend.get(tag, [])) for tag in tags]
+    }, columns=PROFILE_COLUMNS)
+
+    return profile.sort_values('cardinality', ascending=False, ignore_index=True)
+
+
+def run_tag_profile(tags: List[str], spend: pd.DataFrame = None, ttl: int = TAG_CACHE_TTL,
+                    months: int = 6) -> pd.DataFrame:
+    """
+        profiles the values of every active cost allocation tag and saves the
+        result to tag_profile.csv.
+
+        :param spend: the result of `tag_coverage.tag_spend`, if it was
+        already queried; otherwise it is queried (one billed Cost Explorer
+        request per tag) and cached per account for `ttl` seconds.
+    """
+
+    if not tags:
+        logger.warning('no active cost allocation tags, skipping the tag profile')
+        return None
+
+    if spend is None:
+        spend = cached_tag_spend(tags, ttl=ttl, months=months)
+    profile = profile_values(tags, spend)
+
+    cwd = os.getcwd()
+    file_path = cwd+'/tag_profile.csv'
+    profile.to_csv(file_path, index=False)
+
+    high = profile.loc[profile['high_cardinality'], 'tag']
+    if len(high) > 0:
+        logger.warning(
+            f'{len(high)} tag(s) with more than {HIGH_CARDINALITY} values will slow down the LeanIX cost import: [bold]{", ".join(high[:10])}[/bold]', extra={"markup": True})
+    logger.info(f'saved cost allocation tag profile @ {file_path}')
+
+    return profile
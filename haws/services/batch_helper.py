@@ -0,0 +1,184 @@
+import json
+import os
+import traceback
+import boto3
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+from haws.main import logger, setup_logging, stop_logging
+from haws.services.aws.client_pool import reset as reset_client_pool
+from haws.services.runtime_helper import runtime_settings
+from haws.services.report_sink import open_report, close_report
+from haws.services.aws.credential_check import login
+from haws.services.aws.policy_check import check_policies
+from haws.services.aws.organization_check import run_org_check
+from haws.services.aws.cost_allocation_tags import get_tags, create_tag_report
+from haws.services.lx_api_connector import overwrite_scan_config
+from haws.services.aws.rate_limiter import save_limiter_stats, reset as reset_rate_limiter
+from haws.services.orchestrator import Phase, run_phases
+
+
+def read_profiles(filename: str) -> List[dict]:
+    """
+        reads the profiles of a batch run: a JSON list with one object per
+        organization, holding a unique `name` and either the runtime settings
+        (`aws_id`, `aws_key`, `lx_host`, `lx_apitoken`) or the name of an AWS
+        CLI profile with static keys as `aws_profile`.
+    """
+
+    with open(filename, 'r') as fh:
+        profiles = json.load(fh)
+
+    names = [profile['name'] for profile in profiles]
+    if len(set(names)) != len(names):
+        raise ValueError('profile names must be unique')
+
+    return profiles
+
+
+def profile_settings(profile: dict) -> dict:
+    settings = {key: value for key, value in profile.items()
+                if key not in ('name', 'aws_profile')}
+
+    if 'aws_profile' in profile and 'aws_id' not in profile:
+        credentials = boto3.Session(profile_name=profile['aws_profile']).get_credentials(
+        ).get_frozen_credentials()
+        settings['aws_id'] = credentials.access_key
+        settings['aws_key'] = credentials.secret_key
+
+    return settings
+
+
+def isolate_profile(profile: dict, output_dir: str) -> str:
+    """
+        points the current worker process at the profile: its own output
+        directory, runtime config, credentials, client pool, rate limits and
+        log file.
+    """
+
+    # unusable profiles (unknown AWS profile, missing keys) fail before
+    # anything of the worker is changed
+    settings = profile_settings(profile)
+    aws_id, aws_key = settings['aws_id'], settings['aws_key']
+
+    os.makedirs(output_dir, exist_ok=True)
+    os.chdir(output_dir)
+
+    runtime = os.path.join(output_dir, 'runtime.json')
+    runtime_settings(runtime).save(settings)
+
+    os.environ['HAWS_RUNTIME'] = runtime
+    os.environ['AWS_ACCESS_KEY_ID'] = aws_id
+    os.environ['AWS_SECRET_ACCESS_KEY'] = aws_key
+    for variable in ('AWS_SESSION_TOKEN', 'AWS_PROFILE'):
+        os.environ.pop(variable, None)
+    reset_client_pool()
+    # forked workers inherit the buckets and statistics of earlier profiles
+    reset_rate_limiter()
+
+    # spawned workers never ran the cli group callback
+    setup_logging(log_file=os.path.join(output_dir, 'healthcheck.log'))
+
+    return runtime
+
+
+def run_profile(profile: dict, output_dir: str, get_org: bool = False,
+                write_config: bool = False, bulk_accounts: bool = False) -> dict:
+    """
+        runs the full check pipeline for one profile in the current process.
+        never prompts; failures are reported in the returned summary.
+    """
+
+    summary = {'profile': profile['name'], 'output_dir': output_dir}
+    runtime = None
+
+    try:
+        # a profile without usable credentials fails here, not the batch
+        runtime = isolate_profile(profile, output_dir)
+        open_report(directory=output_dir)
+
+        phases = [
+            Phase('login', login),
+            Phase('policy', lambda login: check_policies(
+                login_info=login), depends_on=['login']),
+            Phase('cost_tags', lambda login: get_tags(), depends_on=['login']),
+            Phase('tag_report', lambda policy, cost_tags: create_tag_report(
+                tags=cost_tags or []), depends_on=['policy', 'cost_tags'])
+        ]
+        if get_org:
+            phases.append(Phase('org', lambda login: run_org_check(
+                bulk_accounts=bulk_accounts, login_info=login), depends_on=['login']))
+        if write_config and get_org:
+            phases.append(Phase('write_config', lambda org: overwrite_scan_config(
+                scan_config=org), depends_on=['org']))
+
+        results = run_phases(phases)
+
+        summary['account'] = results['login']['account']
+        summary.update(results['policy'])
+        summary['cost_tags'] = len(results['cost_tags'] or [])
+        if get_org:
+            summary['scan_accounts'] = len(results['org'])
+        summary['status'] = 'ok'
+
+    except BaseException as e:
+        summary['status'] = 'error'
+        summary['error'] = repr(e)
+        summary['traceback'] = traceback.format_exc()
+
+    finally:
+        close_report()
+        # nothing was written for a profile that could not be isolated
+        if runtime is not None:
+            save_limiter_stats()
+            # the runtime config holds the profile's secrets
+            if os.path.exists(runtime):
+                os.remove(runtime)
+        # pool workers exit without running atexit hooks
+        stop_logging()
+
+    return summary
+
+
+def run_batch(profiles: List[dict], output_dir: str, workers: int = None, **options) -> pd.DataFrame:
+    """
+        runs every profile in its own worker process and aggregates the
+        summaries into `batch_report.csv` in the output directory.
+        each organization is a different account, so per-account API limits
+        are not shared between the workers.
+    """
+
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(profiles))
+
+    summaries = list()
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {executor.submit(run_profile, profile, os.path.join(
+            output_dir, profile['name']), **options): profile for profile in profiles}
+
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as e:
+                # e.g. a worker process that died
+                profile = futures[future]
+                summary = {'profile': profile['name'], 'output_dir': os.path.join(output_dir, profile['name']),
+                           'status': 'error', 'error': repr(e)}
+            summaries.append(summary)
+            if summary['status'] == 'ok':
+                logger.info(
+                    f'[bold green]{summary["profile"]}[/bold green]: {summary["passed_checks"]}/{summary["num_healthchecks"]} checks passed', extra={"markup": True})
+            else:
+                logger.error(
+                    f'[danger]{summary["profile"]}: {summary["error"]}[/danger]', extra={"markup": True})
+
+    report = pd.DataFrame(summaries).sort_values('profile')
+    file_path = os.path.join(output_dir, 'batch_report.csv')
+    report.drop(columns=['traceback'], errors='ignore').to_csv(
+        file_path, index=False)
+    logger.info(
+        f'saved batch report for {len(report)} profile(s) @ {file_path}')
+
+    return report
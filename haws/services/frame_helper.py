@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+from typing import List
+
+
+class ColumnBuffer:
+    """
+        append-only, column-oriented row collector.
+        rows are appended to one list per column in O(1) and the DataFrame is
+        built once by to_frame(), instead of copying a frame on every row.
+    """
+
+    def __init__(self, columns: List[str]):
+        self.columns = list(columns)
+        self._data = {column: list() for column in self.columns}
+
+    def __len__(self):
+        return len(self._data[self.columns[0]])
+
+    def append(self, row: dict):
+        for column in self.columns:
+            self._data[column].append(row.get(column, np.nan))
+
+    def extend(self, rows: List[dict]):
+        for row in rows:
+            self.append(row)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self._data, columns=self.columns)
@@ -0,0 +1,79 @@
+import copy
+import json
+import logging
+import re
+import sys
+from logging.handlers import QueueHandler
+
+LOG_FILE_FORMAT = '%(levelname)s-%(asctime)s - %(message)s - line %(lineno)d - %(filename)s'
+LOG_DATE_FORMAT = '%b-%d-%y %H:%M:%S'
+
+# the styles of the rich markup in log messages: text attributes, colors
+# and the styles of the logger theme (config/logger.ini)
+STYLES = ['bold', 'dim', 'italic', 'underline', 'strike', 'reverse', 'blink',
+          'black', 'red', 'green', 'yellow', 'blue', 'magenta', 'cyan', 'white', 'grey',
+          'info', 'warning', 'danger']
+# tags such as [info], [/bold blue] or [/]; other bracketed text, e.g. an
+# empty list logged as [], is kept
+MARKUP = re.compile(r'\[(?:/|/?(?:{0})(?: (?:{0}))*)\]'.format('|'.join(STYLES)))
+
+
+class JSONFormatter(logging.Formatter):
+    """
+        one JSON object per line. the style tags of rich markup are stripped
+        with a regex instead of being parsed.
+    """
+
+    def plain(self, record: logging.LogRecord) -> str:
+        # only messages logged with extra={"markup": True} carry markup
+        message = record.getMessage()
+        return MARKUP.sub('', message) if getattr(record, 'markup', False) else message
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'message': self.plain(record),
+            'file': record.filename,
+            'line': record.lineno
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class LocalQueueHandler(QueueHandler):
+    """
+        the queue never leaves the process, so records keep their exc_info
+        and markup flags for the rich handler on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def log_handlers(log_format: str, log_file: str, theme_file: str) -> list:
+    """
+        the handlers the queue listener hands the records to.
+    """
+
+    f_handler = logging.FileHandler(log_file, mode='w+')
+
+    if log_format == 'json':
+        f_handler.setFormatter(JSONFormatter())
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(JSONFormatter())
+        return [f_handler, console_handler]
+
+    from rich.console import Console
+    from rich.logging import RichHandler
+    from rich.theme import Theme
+
+    logger_console = Console(theme=Theme().read(
+        theme_file), log_time_format=LOG_DATE_FORMAT)
+    f_handler.setFormatter(logging.Formatter(
+        LOG_FILE_FORMAT, datefmt=LOG_DATE_FORMAT))
+    return [f_handler, RichHandler(console=logger_console, rich_tracebacks=True)]
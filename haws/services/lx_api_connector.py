@@ -2,7 +2,7 @@ import json
 import requests
 import pandas as pd
 from typing import List
-from haws.services.setup_helper import get_runtime_settings
+from haws.services.runtime_helper import get_runtime_settings
 from haws.main import logger
 
 
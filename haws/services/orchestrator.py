@@ -0,0 +1,78 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, List
+from haws.main import logger
+
+
+class Phase:
+    """
+        a step of a run. `func` is called with the results of the phases it
+        depends on as keyword arguments, named after those phases.
+    """
+
+    def __init__(self, name: str, func: Callable, depends_on: List[str] = ()):
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on)
+
+
+def timed_call(phase: Phase, kwargs: dict):
+    start = time.perf_counter()
+    result = phase.func(**kwargs)
+    return result, time.perf_counter() - start
+
+
+def log_timings(timings: dict, wall_time: float):
+    logger.info('[bold]Run Phases[/bold]', extra={"markup": True})
+    for name, duration in timings.items():
+        logger.info(f'{name:<14} {duration:8.2f}s')
+    logger.info(
+        f'[bold]{"total":<14} {wall_time:8.2f}s[/bold] (sequential: {sum(timings.values()):.2f}s)', extra={"markup": True})
+
+
+def run_phases(phases: List[Phase], max_workers: int = 4) -> dict:
+    """
+        runs the phases as a dependency graph: every phase starts as soon as
+        all phases it depends on have finished, independent phases run
+        concurrently. if a phase fails, no further phases are started and the
+        error is re-raised once the running phases are done.
+
+        :returns dict: phase name -> result
+    """
+
+    pending = {phase.name: phase for phase in phases}
+    for phase in phases:
+        unknown = [dep for dep in phase.depends_on if dep not in pending]
+        if len(unknown) != 0:
+            raise ValueError(f'phase {phase.name} depends on unknown phase(s) {unknown}')
+
+    results = dict()
+    timings = dict()
+    running = dict()
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(pending) != 0 or len(running) != 0:
+            ready = [phase for phase in pending.values()
+                     if all(dep in results for dep in phase.depends_on)]
+            for phase in ready:
+                kwargs = {dep: results[dep] for dep in phase.depends_on}
+                running[executor.submit(timed_call, phase, kwargs)] = phase
+                del pending[phase.name]
+
+            if len(running) == 0:
+                raise ValueError(f'circular dependency between phases {list(pending)}')
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                phase = running.pop(future)
+                try:
+                    results[phase.name], timings[phase.name] = future.result()
+                except BaseException:
+                    wait(running)
+                    raise
+
+    log_timings({phase.name: timings[phase.name] for phase in phases},
+                time.perf_counter() - start)
+
+    return results
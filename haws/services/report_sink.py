@@ -0,0 +1,296 @@
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import List
+from xml.sax.saxutils import escape, quoteattr
+
+REPORT_FORMATS = ['text', 'json', 'ndjson', 'junit']
+REPORT_FILES = {
+    'text': 'report.txt',
+    'json': 'report.json',
+    'ndjson': 'report.ndjson',
+    'junit': 'report.xml'
+}
+TEXT_WIDTH = 75
+STATUS_SYMBOLS = {'passed': '✅', 'failed': '🛑', 'info': 'ℹ️'}
+
+
+class ReportSink:
+    """
+        receives the check results of a run one by one. every result is a
+        dict with `section`, `check`, `status` (passed, failed or info),
+        `message` and optional `details`; sections are opened and closed
+        around their results.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def start_section(self, section: str, title: str):
+        pass
+
+    def write(self, result: dict):
+        raise NotImplementedError
+
+    def end_section(self, section: str, summary: dict = None):
+        pass
+
+    def close(self):
+        pass
+
+
+class TextSink(ReportSink):
+    """
+        the human readable report.txt, written line by line.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.fh = open(path, 'w', encoding='utf-8')
+        self.sections = 0
+
+    def rule(self, title: str = ''):
+        title = f' {title} ' if title else ''
+        self.fh.write(title.center(TEXT_WIDTH, '─') + '\n')
+
+    def start_section(self, section: str, title: str):
+        if self.sections > 0:
+            self.fh.write('\n')
+        self.sections += 1
+        self.rule(title)
+
+    def write(self, result: dict):
+        self.fh.write(f'{STATUS_SYMBOLS.get(result["status"], "")} {result["message"]}\n')
+        for key, value in (result.get('details') or {}).items():
+            if isinstance(value, list) and len(value) > 0:
+                self.fh.write(f'   {key.replace("_", " ")}: {", ".join(map(str, value))}\n')
+        self.fh.flush()
+
+    def end_section(self, section: str, summary: dict = None):
+        if summary is None:
+            return
+        self.rule()
+        if summary['failed'] == 0:
+            self.fh.write(f'{STATUS_SYMBOLS["passed"]} {summary["passed"]}/{summary["total"]} checks passed\n')
+        else:
+            self.fh.write(f'{STATUS_SYMBOLS["failed"]} {summary["failed"]}/{summary["total"]} checks failed\n')
+        self.fh.flush()
+
+    def close(self):
+        self.fh.close()
+
+
+class NDJSONSink(ReportSink):
+    """
+        one JSON object per result and section summary, flushed per line so
+        monitoring can tail the file while the run is going.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.fh = open(path, 'w', encoding='utf-8')
+
+    def emit(self, record: dict):
+        self.fh.write(self.encode(record))
+        self.fh.flush()
+
+    def encode(self, record: dict) -> str:
+        return json.dumps(record, default=str) + '\n'
+
+    def write(self, result: dict):
+        self.emit(dict(result, type='result'))
+
+    def end_section(self, section: str, summary: dict = None):
+        if summary is not None:
+            self.emit(dict(summary, type='summary', section=section))
+
+    def close(self):
+        self.fh.close()
+
+
+class JSONSink(NDJSONSink):
+    """
+        the same records as NDJSON, streamed into one JSON array.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.fh.write('[')
+        self.records = 0
+
+    def encode(self, record: dict) -> str:
+        separator = ',\n' if self.records > 0 else '\n'
+        self.records += 1
+        return separator + json.dumps(record, default=str)
+
+    def close(self):
+        self.fh.write('\n]\n')
+        self.fh.close()
+
+
+class JUnitSink(ReportSink):
+    """
+        JUnit XML with one testsuite per section and one testcase per result.
+        the testsuite counts come first in the XML, so the testcases of the
+        open section are spooled to a temporary file until it is closed.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.fh = open(path, 'w', encoding='utf-8')
+        self.fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n')
+        self.section = None
+
+    def start_section(self, section: str, title: str):
+        self.section = section
+        self.title = title
+        self.cases = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self.counts = {'tests': 0, 'failures': 0}
+
+    def write(self, result: dict):
+        self.counts['tests'] += 1
+        self.cases.write(
+            f'    <testcase classname={quoteattr("haws." + result["section"])} name={quoteattr(str(result["check"]))}>\n')
+        if result['status'] == 'failed':
+            self.counts['failures'] += 1
+            details = json.dumps(result.get('details') or {}, default=str)
+            self.cases.write(
+                f'      <failure message={quoteattr(result["message"])}>{escape(details)}</failure>\n')
+        else:
+            self.cases.write(f'      <system-out>{escape(result["message"])}</system-out>\n')
+        self.cases.write('    </testcase>\n')
+
+    def end_section(self, section: str, summary: dict = None):
+        self.fh.write(
+            f'  <testsuite name={quoteattr(self.title)} tests="{self.counts["tests"]}" failures="{self.counts["failures"]}">\n')
+        self.cases.seek(0)
+        shutil.copyfileobj(self.cases, self.fh)
+        self.cases.close()
+        self.fh.write('  </testsuite>\n')
+        self.fh.flush()
+        self.section = None
+
+    def close(self):
+        if self.section is not None:
+            self.end_section(self.section)
+        self.fh.write('</testsuites>\n')
+        self.fh.close()
+
+
+SINKS = {
+    'text': TextSink,
+    'json': JSONSink,
+    'ndjson': NDJSONSink,
+    'junit': JUnitSink
+}
+
+
+class Report:
+    """
+        fans every result out to the sinks of the configured formats.
+        phases of a run may report from different threads; a section is
+        written as a whole by the thread that opened it.
+    """
+
+    def __init__(self, formats: List[str] = ('text',), directory: str = None):
+        directory = directory or os.getcwd()
+        unknown = set(formats) - set(REPORT_FORMATS)
+        if unknown:
+            raise ValueError(f'unknown report format(s) {sorted(unknown)}, expected {REPORT_FORMATS}')
+
+        self.paths = {fmt: os.path.join(directory, REPORT_FILES[fmt]) for fmt in formats}
+        self.sinks = [SINKS[fmt](path) for fmt, path in self.paths.items()]
+        self.lock = threading.RLock()
+
+    def section(self, section: str, title: str) -> 'ReportSection':
+        return ReportSection(self, section, title)
+
+    def close(self):
+        with self.lock:
+            for sink in self.sinks:
+                sink.close()
+            self.sinks = []
+
+
+class ReportSection:
+    """
+        context manager for one section of a report:
+
+            with get_report().section('policy', 'Policy Checks') as section:
+                section.write(check, status, message, details)
+                section.summary = {...}
+    """
+
+    def __init__(self, report: Report, section: str, title: str):
+        self.report = report
+        self.section = section
+        self.title = title
+        self.summary = None
+
+    def __enter__(self) -> 'ReportSection':
+        self.report.lock.acquire()
+        for sink in self.report.sinks:
+            sink.start_section(self.section, self.title)
+        return self
+
+    def write(self, check: str, status: str, message: str, details: dict = None):
+        result = {'section': self.section, 'check': check, 'status': status,
+                  'message': message, 'details': details or {}}
+        for sink in self.report.sinks:
+            sink.write(result)
+
+    def __exit__(self, *exc):
+        try:
+            for sink in self.report.sinks:
+                sink.end_section(self.section, self.summary)
+        finally:
+            self.report.lock.release()
+
+
+_lock = threading.Lock()
+_report = None
+
+
+def open_report(formats: List[str] = ('text',), directory: str = None) -> Report:
+    """
+        starts the report of a run, replacing (and closing) a previous one.
+    """
+
+    global _report
+
+    with _lock:
+        if _report is not None:
+            _report.close()
+        _report = Report(formats, directory)
+
+    return _report
+
+
+def get_report() -> Report:
+    """
+        the report of the current run; a text report in the working
+        directory if none was opened.
+    """
+
+    global _report
+
+    with _lock:
+        if _report is None:
+            _report = Report()
+
+    return _report
+
+
+def close_report():
+    global _report
+
+    with _lock:
+        if _report is not None:
+            _report.close()
+            _report = None
+
+
+atexit.register(close_report)
@@ -1,13 +1,154 @@
 from pathlib import Path
+import hashlib
 import json
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # windows: the thread lock still guards this process
+    fcntl = None
 
 root_dir = str(Path(__file__).parent.parent.absolute())
 runtime = root_dir + '/config/runtime.json'
+cache_dir = os.getenv('HAWS_CACHE_DIR', str(Path.home()) + '/.cache/haws')
+
+_registry_lock = threading.Lock()
+_settings = {}
+
+
+def get_runtime_path() -> str:
+    """
+        the runtime config can be relocated with the HAWS_RUNTIME environment
+        variable, e.g. to give every profile of a batch run its own config.
+    """
+
+    return os.getenv('HAWS_RUNTIME', runtime)
+
+
+class RuntimeSettings:
+    """
+        in-memory copy of one runtime config file.
+        reads only re-parse the file when its size or mtime changed; writes go
+        through to disk under a file lock and replace the file atomically, so
+        readers never see a half-written config.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._lock = threading.RLock()
+        self._data = None
+        self._stamp = None
+
+    def _file_stamp(self) -> tuple:
+        # raises FileNotFoundError like the plain open() did before
+        stat = os.stat(self.filename)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> dict:
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            with open(self.filename, 'r') as fh:
+                self._data = json.load(fh)
+            self._stamp = stamp
+        return self._data
+
+    def _write(self, data: dict):
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(data, fh, indent=4)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, self.filename)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._data = data
+        self._stamp = self._file_stamp()
+
+    def _lock_path(self) -> str:
+        # lock files live in the cache, so nothing is left next to a config
+        # that is removed after the run
+        digest = hashlib.sha1(self.filename.encode()).hexdigest()
+        return os.path.join(cache_dir, 'locks', 'runtime-' + digest + '.lock')
+
+    def _file_lock(self):
+        # POSIX record locks are per process and not inherited on fork,
+        # unlike flock; threads of this process are serialized by self._lock
+        lock_path = self._lock_path()
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        lock_file = open(lock_path, 'a')
+        if fcntl is not None:
+            fcntl.lockf(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return dict(self._read())
+
+    def __getitem__(self, key: str):
+        with self._lock:
+            return self._read()[key]
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            return self._read().get(key, default)
+
+    def update(self, data: dict) -> dict:
+        """
+            merges `data` into the settings on disk. the file is re-read under
+            the lock, so keys written by another process are kept.
+        """
+
+        with self._lock, self._file_lock():
+            self._stamp = None
+            settings = dict(self._read())
+            settings.update(data)
+            self._write(settings)
+            return dict(settings)
+
+    def save(self, data: dict):
+        """
+            replaces the whole config, e.g. after `haws setup`.
+        """
+
+        with self._lock, self._file_lock():
+            self._write(dict(data))
+
+
+def runtime_settings(filename: str = None) -> RuntimeSettings:
+    """
+        :returns RuntimeSettings: the one settings object of this process for
+        the runtime config, by default the one at `get_runtime_path()`.
+    """
+
+    if filename is None:
+        filename = get_runtime_path()
+    filename = os.path.abspath(filename)
+
+    with _registry_lock:
+        if filename not in _settings:
+            _settings[filename] = RuntimeSettings(filename)
+        return _settings[filename]
+
+
+def _reset_after_fork():
+    # a forked worker may inherit locks held by threads of the parent
+    global _registry_lock, _settings
+    _registry_lock = threading.Lock()
+    _settings = {}
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 
-def get_runtime_settings(filename: str = runtime):
+def get_runtime_settings(filename: str = None) -> dict:
+    return runtime_settings(filename).as_dict()
 
-    with open(filename, 'r') as fh:
-        settings = json.load(fh)
 
-    return settings
+def update_runtime_settings(data: dict, filename: str = None) -> dict:
+    return runtime_settings(filename).update(data)
@@ -1,29 +1,7 @@
-import json
 import re
 from rich.prompt import Prompt
-from pathlib import Path
 from haws.services.aws.credential_check import login
-
-root_dir = str(Path(__file__).parent.parent.absolute())
-runtime = root_dir + '/config/runtime.json'
-
-
-def get_runtime_settings(filename: str = runtime):
-
-    with open(filename, 'r') as fh:
-        settings = json.load(fh)
-
-    return settings
-
-
-def update_runtime_settings(data: dict, filename: str = runtime):
-    current_settings = get_runtime_settings(filename=filename)
-
-    for key, value in data.items():
-        current_settings[key] = value
-
-    with open(runtime, 'w') as fh:
-        json.dump(current_settings, fh, indent=4)
+from haws.services.runtime_helper import runtime_settings
 
 
 def setup_cli():
@@ -43,5 +21,4 @@ def setup_cli():
         'lx_apitoken': lx_apitoken
     }
 
-    with open(runtime, 'w') as fh:
-        json.dump(export, fh, indent=4)
+    runtime_settings().save(export)